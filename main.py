@@ -1,36 +1,41 @@
 import sys
-
-from PyQt6.QtWidgets import (
-    QApplication,  QMessageBox, QStyleFactory
-)
-from PyQt6.QtGui import QPalette, QColor
-
-from watchdog.observers import Observer
-
-from main_ui import CaptureGUI
-
-from main_classes import cleanup_processes
+import multiprocessing
 
 
 # ----------------------------------------------------------------------
 # Блокировка дублирующего запуска (Windows)
 # ----------------------------------------------------------------------
-if sys.platform.startswith('win'):
-    import win32event
-    import win32api
-    from winerror import ERROR_ALREADY_EXISTS
-    mutex = win32event.CreateMutex(None, False, "Global\\CaptureApp_SingleInstance_Mutex")
-    if win32api.GetLastError() == ERROR_ALREADY_EXISTS:
-        QMessageBox.critical(None, "Ошибка", "Приложение уже запущено!")
-        sys.exit(1)
-
+def check_single_instance():
+    from PyQt6.QtWidgets import QMessageBox
+    if sys.platform.startswith('win'):
+        import win32event
+        import win32api
+        from winerror import ERROR_ALREADY_EXISTS
+        global mutex
+        mutex = win32event.CreateMutex(None, False, "Global\\CaptureApp_SingleInstance_Mutex")
+        if win32api.GetLastError() == ERROR_ALREADY_EXISTS:
+            QMessageBox.critical(None, "Ошибка", "Приложение уже запущено!")
+            sys.exit(1)
 
 
 # ----------------------------------------------------------------------
 # Запуск
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
-    cleanup_processes()
+    # Процессы кодирования видео запускаются через spawn и импортируют этот модуль как __mp_main__:
+    # GUI, Selenium и main_classes импортируются только здесь, чтобы дочерние процессы их не грузили
+    multiprocessing.freeze_support()
+
+    from PyQt6.QtWidgets import QApplication, QStyleFactory
+    from PyQt6.QtGui import QPalette, QColor
+
+    from main_ui import CaptureGUI
+    from main_classes import BROWSER_POOL
+    from main_function import setup_logging
+
+    setup_logging()
+    check_single_instance()
+    BROWSER_POOL.cleanup_orphans()
     app = QApplication(sys.argv)
     app.setStyle(QStyleFactory.create('Fusion'))
 
@@ -40,4 +45,4 @@ if __name__ == "__main__":
 
     window = CaptureGUI()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
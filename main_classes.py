@@ -1,13 +1,20 @@
 import os
 import time
+import heapq
+import collections
+import functools
+import threading
 from datetime import datetime, timedelta
 import logging
 import queue
 import cv2
-import glob
 import sys
 import io
+import json
+import base64
 import numpy as np
+import psutil
+import websocket
 from PIL import Image
 from logging.handlers import RotatingFileHandler
 from ruamel.yaml import YAML
@@ -21,7 +28,14 @@ from selenium.webdriver.support import expected_conditions as EC
 
 from watchdog.events import FileSystemEventHandler
 
-from main_function import rotate_log_if_needed, cleanup_processes, is_image_black
+from main_function import rotate_log_if_needed, kill_process_tree
+from main_video import SegmentEncoder, VideoEncoder, EncodeProcess, JobConfig, read_segments
+from main_ring import FrameRing
+from main_pack import PackWriter, frame_time, pack_frame_count
+from main_index import day_index
+from main_health import FrameHealth, MotionDetector, HEALTH_DEFAULTS, MOTION_DEFAULTS
+from main_quality import QualityController, QUALITY_DEFAULTS
+from main_retention import RetentionManager, RETENTION_DEFAULTS
 
 
 # ----------------------------------------------------------------------
@@ -38,7 +52,7 @@ class CaptureAppGUI:
         self.current_state = None
         self.last_video_date = None
         self.last_video_triggered = False
-        self.last_log_date = None
+        self.encode_queue = None     # EncodeQueue планировщика; None — кодирование прямо в такте
 
     def reset_video_trigger(self):
         self.last_video_date = None
@@ -64,89 +78,92 @@ class CaptureAppGUI:
         total = self.frame_capture.count_existing_frames()
         last_file_full = self.frame_capture.last_file if self.frame_capture.last_file else None
         self.gui_queue.put(('status', total, last_file_full))
+        motion = self.frame_capture.motion
+        if motion.enabled:
+            self.gui_queue.put(('motion_stats', *motion.stats(), motion.bursting()))
 
     def _send_stopped(self):
         total = self.frame_capture.count_existing_frames()
         next_str = self._next_start_time()
         self.gui_queue.put(('status', total, f"stop:{next_str}"))
 
-    def run(self):
-        self._init_state()
-        while True:
-            try:
-                updated = self.config_queue.get_nowait()
-                self.config_manager.config = updated
-                logging.info("Конфиг обновлён из GUI")
-            except queue.Empty:
-                pass
-
-            now = datetime.now()
-            today_str = now.strftime("%Y%m%d")
-            cur_total = now.hour * 60 + now.minute
-            st_total = self._get_minutes(self.config_manager['time_begin'])
-            en_total = self._get_minutes(self.config_manager['time_end'])
-            new_state = "work" if st_total <= cur_total < en_total else "off"
-
-            if self.last_log_date != today_str:
-                rotate_log_if_needed()
-                self.last_log_date = today_str
+    @property
+    def interval(self):
+        base = max(0.01, float(self.config_manager['time_period_interval']))
+        if self.frame_capture.motion.bursting():
+            # Движение в кадре — снимаем чаще, пока не пройдёт motion_burst_sec
+            return min(base, max(0.01, float(self.config_manager.get('motion_burst_interval', 0.2))))
+        return base
+
+    def attach_driver(self, driver):
+        self.driver = driver
+        self.frame_capture.driver = driver
 
-            if self.current_state != new_state:
-                self.current_state = new_state
-                if new_state == "work":
-                    logging.info(f"Старт захвата: {now.strftime('%Y-%m-%d %H:%M:%S')}")
-                    self._update_status()
-                else:
-                    logging.info(f"Остановка. Следующий: {self._next_start_time()}")
-                    self._send_stopped()
-                    self.gui_queue.put(('capture_progress', 0, "--:--", "--:--"))
+    def tick(self):
+        """Один такт камеры: смена состояния, захват кадра или запуск конвертации"""
+        now = datetime.now()
+        today_str = now.strftime("%Y%m%d")
+        cur_total = now.hour * 60 + now.minute
+        st_total = self._get_minutes(self.config_manager['time_begin'])
+        en_total = self._get_minutes(self.config_manager['time_end'])
+        new_state = "work" if st_total <= cur_total < en_total else "off"
 
-            if self.current_state == "work":
-                if self.frame_capture.capture():
-                    self._update_status()
+        if self.current_state != new_state:
+            self.current_state = new_state
+            if new_state == "work":
+                logging.info(f"{self.config_manager.tag}Старт захвата: {now.strftime('%Y-%m-%d %H:%M:%S')}")
+                self._update_status()
+            else:
+                logging.info(f"{self.config_manager.tag}Остановка. Следующий: {self._next_start_time()}")
+                self._send_stopped()
+                self.gui_queue.put(('capture_progress', 0, "--:--", "--:--"))
 
-                begin_min = st_total
-                end_min = en_total
-                current_min = cur_total
+        if self.current_state == "work":
+            if self.frame_capture.capture():
+                self._update_status()
 
-                if end_min > begin_min:
-                    progress = (current_min - begin_min) / (end_min - begin_min) * 100
-                    progress = max(0, min(100, progress))
-                else:
-                    progress = 0
+            begin_min = st_total
+            end_min = en_total
+            current_min = cur_total
 
-                current_time = now.strftime("%H:%M")
-                remaining_min = max(0, end_min - current_min)
-                remaining_str = f"{remaining_min // 60:02d}:{remaining_min % 60:02d}"
+            if end_min > begin_min:
+                progress = (current_min - begin_min) / (end_min - begin_min) * 100
+                progress = max(0, min(100, progress))
+            else:
+                progress = 0
 
-                self.gui_queue.put(('capture_progress', progress, current_time, remaining_str))
+            current_time = now.strftime("%H:%M")
+            remaining_min = max(0, end_min - current_min)
+            remaining_str = f"{remaining_min // 60:02d}:{remaining_min % 60:02d}"
 
-            if self.current_state == "off":
-                video_total = self._get_minutes(self.config_manager['time_video'])
+            self.gui_queue.put(('capture_progress', progress, current_time, remaining_str))
 
-                if self.last_video_date != today_str:
-                    self.last_video_date = today_str
-                    self.last_video_triggered = False
-                    logging.info(f"Сброс триггера конвертации для новой даты: {today_str}")
+        if self.current_state == "off":
+            video_total = self._get_minutes(self.config_manager['time_video'])
 
-                if cur_total >= video_total and not self.last_video_triggered:
-                    if self.frame_capture.count_existing_frames() == 0:
-                        logging.info(f"Нет кадров за {today_str} — конвертация пропущена")
-                        self.last_video_triggered = True
-                        continue
+            if self.last_video_date != today_str:
+                self.last_video_date = today_str
+                self.last_video_triggered = False
+                logging.info(f"{self.config_manager.tag}Сброс триггера конвертации для новой даты: {today_str}")
 
-                    logging.info(f"Запуск конвертации за {today_str} в {self.config_manager['time_video']}")
-                    self.encoder.encode(today_str)
+            if cur_total >= video_total and not self.last_video_triggered:
+                if self.frame_capture.count_existing_frames() == 0:
+                    logging.info(f"{self.config_manager.tag}Нет кадров за {today_str} — конвертация пропущена")
                     self.last_video_triggered = True
+                    return
 
-            time.sleep(max(0.01, float(self.config_manager['time_period_interval'])))
+                logging.info(f"{self.config_manager.tag}Запуск конвертации за {today_str} в {self.config_manager['time_video']}")
+                if self.encode_queue is not None:
+                    self.encode_queue.put(self.config_manager.name, today_str)
+                else:
+                    self.encoder.encode(today_str)
+                self.last_video_triggered = True
 
     def _init_state(self):
         now = datetime.now()
         today_str = now.strftime("%Y%m%d")
         self.last_video_date = today_str
         self.last_video_triggered = False
-        self.last_log_date = today_str
 
         cur_total = now.hour * 60 + now.minute
         st_total = self._get_minutes(self.config_manager['time_begin'])
@@ -173,71 +190,760 @@ class CaptureAppGUI:
 
 
 # ----------------------------------------------------------------------
-# Драйвер, FrameCapture, VideoEncoder — без изменений, кроме FrameCapture
+# Планировщик камер: один цикл на воркер, воркер = один браузер
 # ----------------------------------------------------------------------
-class BrowserDriver:
-    def __init__(self, config):
-        self.config = config
+class CameraQueue:
+    """Прокси gui_queue: помечает сообщения камеры её именем"""
+    def __init__(self, gui_queue, camera):
+        self.gui_queue = gui_queue
+        self.camera = camera
+
+    def put(self, msg):
+        self.gui_queue.put(('camera', self.camera, msg))
+
+
+class CaptureScheduler:
+    HEALTH_PERIOD = 30
+    STATS_PERIOD = 60
+    STATS_LOG_PERIOD = 600
+
+    def __init__(self, config_manager, gui_queue, config_queue):
+        self.config_manager = config_manager
+        self.gui_queue = gui_queue
+        self.config_queue = config_queue
+        self.config_lock = threading.Lock()
+        self.log_lock = threading.Lock()
+        self.log_date = datetime.now().strftime("%Y%m%d")
+        self.cameras = config_manager.get_cameras()
+        self.controllers = {}
+
+        # Один пул записи на все камеры; 0 потоков — кодирование в потоке захвата, как раньше
+        self.writer = None
+        if int(config_manager.get('writer_threads', 2)) > 0:
+            self.writer = FrameWriter(
+                int(config_manager.get('writer_threads', 2)),
+                int(config_manager.get('writer_queue', 8)),
+                str(config_manager.get('writer_policy', 'drop_oldest'))
+            )
+
+        for name in self.cameras:
+            cam_config = CameraConfig(config_manager, name)
+            cam_queue = CameraQueue(gui_queue, name)
+            frame_capture = FrameCapture(cam_config, None)
+            frame_capture.writer = self.writer
+            if cam_config.get('video_mode', 'daily') == 'streaming':
+                frame_capture.segments = SegmentEncoder(cam_config)
+            slots = int(cam_config.get('frame_ring_slots', 0))
+            if slots > 0:
+                frame_capture.ring = FrameRing.create(slots, self._ring_slot_bytes(cam_config))
+                logging.info(f"{cam_config.tag}Кольцо кадров {frame_capture.ring.name}: {slots} слотов")
+            encoder = VideoEncoder(cam_config, cam_queue, frame_capture)
+            self.controllers[name] = CaptureAppGUI(cam_config, None, frame_capture, encoder, cam_queue, config_queue)
+
+        self.encode_process = None
+        if config_manager.get('encode_in_process', True):
+            self.encode_process = EncodeProcess(config_manager.get('encode_priority', 'below_normal'),
+                                                config_manager.get('encode_nice', 10))
+        self.encode_queue = EncodeQueue({name: c.encoder for name, c in self.controllers.items()},
+                                        self.encode_process)
+        for controller in self.controllers.values():
+            controller.encode_queue = self.encode_queue
+        self.retention = RetentionManager(config_manager, {name: (c.config_manager, c.gui_queue)
+                                                           for name, c in self.controllers.items()})
+
+        # Камеры раскладываются по воркерам по кругу; каждый воркер держит один Chrome
+        pool_size = max(1, min(int(config_manager.get('max_browsers', 2)), len(self.cameras)))
+        self.workers = [self.cameras[i::pool_size] for i in range(pool_size)]
+
+    def start(self):
+        self.encode_queue.scan()
+        self.encode_queue.start()
+        self.retention.start()
+        for i, names in enumerate(self.workers):
+            threading.Thread(target=self._worker_loop, args=(names,), daemon=True, name=f"capture-worker-{i}").start()
+        threading.Thread(target=self._stats_loop, daemon=True, name="browser-stats").start()
+        logging.info(f"Камер: {len(self.cameras)}, браузеров: {len(self.workers)}")
+
+    @staticmethod
+    def _ring_slot_bytes(cam_config):
+        slot_mb = float(cam_config.get('frame_ring_slot_mb', 0))
+        if slot_mb > 0:
+            return int(slot_mb * 1024 * 1024)
+        # Кадр не больше окна браузера; для потока крупнее — задать frame_ring_slot_mb
+        w, h = map(int, str(cam_config.get('window_size', '1920,1080')).split(','))
+        return w * h * 3
+
+    def shutdown(self):
+        # Открытый сегмент попадает в манифест только при закрытии — иначе его кадры пропали бы из видео
+        for controller in self.controllers.values():
+            if controller.frame_capture.segments is not None:
+                controller.frame_capture.segments.close()
+        if self.encode_process is not None:
+            self.encode_process.stop()
+        for controller in self.controllers.values():
+            if controller.frame_capture.ring is not None:
+                controller.frame_capture.ring.close()
+                controller.frame_capture.ring = None
+
+    def _stats_loop(self):
+        last_log = 0.0
+        while True:
+            time.sleep(self.STATS_PERIOD)
+            stats = BROWSER_POOL.stats()
+            self.gui_queue.put(('browser_stats', stats))
+            if time.monotonic() - last_log >= self.STATS_LOG_PERIOD:
+                last_log = time.monotonic()
+                if self.writer is not None:
+                    ws = self.writer.stats()
+                    logging.info(f"Запись кадров: в очереди {ws['queued']}, записано {ws['written']}, "
+                                 f"отброшено {ws['dropped']}, забраковано {ws['rejected']}, "
+                                 f"без движения {ws['skipped']}")
+                for controller in self.controllers.values():
+                    timings, calls = controller.frame_capture.health.stats()
+                    if calls:
+                        logging.info(f"{controller.config_manager.tag}Проверка кадров ({calls}), мс: " +
+                                     ", ".join(f"{name} {ms:.2f}" for name, ms in timings.items()))
+                    js = controller.frame_capture.jpeg.stats()
+                    if js['target_kb'] and js['frames']:
+                        logging.info(f"{controller.config_manager.tag}JPEG: {js['avg_kb']:.0f} КБ при цели {js['target_kb']:.0f} КБ, "
+                                     f"без optimize {js['fast_share'] * 100:.0f}% "
+                                     f"(кодирование, мс: {js['encode_ms'][False] or 0:.1f} / {js['encode_ms'][True] or 0:.1f}), качество: " +
+                                     ", ".join(f"{q}×{n}" for q, n in js['hist'].items()))
+                    if controller.frame_capture.motion.enabled:
+                        stored, skipped, bursts = controller.frame_capture.motion.stats()
+                        logging.info(f"{controller.config_manager.tag}Движение: сохранено {stored}, "
+                                     f"пропущено без изменений {skipped}, всплесков {bursts}")
+                for st in stats:
+                    logging.info(
+                        f"{st['name']}: PID {st['pid']}, вкладок {st['tabs']}, работает {st['uptime'] / 3600:.1f} ч, "
+                        f"перезапусков {st['restarts']}, RSS {st['rss_mb']:.0f} МБ"
+                    )
+
+    def _check_browsers(self, names):
+        """Упавший Chrome воркера перезапускается здесь же, в потоке-владельце"""
+        hosts = {self.controllers[n].frame_capture.driver.host for n in names if self.controllers[n].frame_capture.driver}
+        for host in hosts:
+            if host.healthy():
+                continue
+            logging.warning(f"Браузер {host.name} не отвечает → перезапуск")
+            try:
+                host.restart()
+            except Exception as e:
+                logging.error(f"Не удалось перезапустить {host.name}: {e}")
+
+    def reset_video_trigger(self):
+        for controller in self.controllers.values():
+            controller.reset_video_trigger()
+
+    def _rotate_log(self):
+        """Смена суток: лог ротирует один воркер — ротация меняет обработчики корневого логгера"""
+        today = datetime.now().strftime("%Y%m%d")
+        if self.log_date == today:
+            return
+        with self.log_lock:
+            if self.log_date != today:
+                rotate_log_if_needed()
+                self.log_date = today
+
+    def _poll_config(self):
+        with self.config_lock:
+            try:
+                updated = self.config_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.config_manager.config = updated
+            logging.info("Конфиг обновлён из GUI")
+            if self.config_manager.get_cameras() != self.cameras:
+                logging.warning("Список камер изменён — применится после перезапуска приложения")
+
+    def _worker_loop(self, names):
+        host = None
+
+        window_size = str(self.config_manager.get('window_size', '1920,1080'))
+
+        def make_driver(controller):
+            # Chrome воркера поднимается только когда он нужен хотя бы одной камере
+            nonlocal host
+            cam_config = controller.config_manager
+            if cam_config.get('hot_standby', False):
+                # Подменяемому браузеру нужен свой Chrome: его чинят в фоне, пока снимает запасной
+                driver = BrowserDriver(cam_config, BrowserHost(window_size))
+                controller.frame_capture.standby = HotStandby(cam_config, window_size)
+            else:
+                if host is None:
+                    host = BrowserHost(window_size)
+                driver = BrowserDriver(cam_config, host)
+            controller.driver = driver
+            return driver
+
+        # Chrome не поднялся — повторяем с паузой как при перезапуске, камеры воркера не бросаем
+        pending = list(names)
+        failures = 0
+        while pending:
+            name = pending[0]
+            controller = self.controllers[name]
+            controller.frame_capture.driver_factory = functools.partial(make_driver, controller)
+            try:
+                if not controller.frame_capture.browserless:
+                    controller.attach_driver(make_driver(controller))
+            except Exception as e:
+                failures += 1
+                delay = min(BrowserHost.BACKOFF_MAX, 2 * 2 ** failures)
+                logging.error(f"Не удалось запустить браузер для камер {pending}: {e} — повтор через {delay} с")
+                if host is not None and not host.healthy():
+                    host.quit()
+                    BROWSER_POOL.unregister(host)
+                    host = None
+                time.sleep(delay)
+                continue
+            pending.pop(0)
+
+        # Первые такты камер разнесены равномерно внутри интервала
+        heap = []
+        clocks = {}
+        start = time.monotonic()
+        for name in names:
+            controller = self.controllers[name]
+            controller._init_state()
+            idx = self.cameras.index(name)
+            clocks[name] = TickClock(controller, start + controller.interval * idx / len(self.cameras))
+            heapq.heappush(heap, (clocks[name].due, idx, name))
+
+        next_health = start + self.HEALTH_PERIOD
+        while True:
+            self._poll_config()
+            self._rotate_log()
+            if time.monotonic() >= next_health:
+                self._check_browsers(names)
+                next_health = time.monotonic() + self.HEALTH_PERIOD
+            due, idx, name = heapq.heappop(heap)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            controller = self.controllers[name]
+            started = time.monotonic()
+            try:
+                controller.tick()
+            except Exception as e:
+                logging.error(f"{controller.config_manager.tag}Ошибка такта: {e}")
+            clock = clocks[name]
+            clock.done(started, time.monotonic())
+            heapq.heappush(heap, (clock.due, idx, name))
+
+
+class TickClock:
+    """Такты камеры по дедлайнам time.monotonic(): длительность такта не сдвигает расписание"""
+    EMA = 0.2               # сглаживание средней длительности такта
+    LATE_FRACTION = 0.1     # старт позже дедлайна на 10% интервала — такт опоздал
+    REPORT_PERIOD = 60
+
+    def __init__(self, controller, first_due):
+        self.controller = controller
+        self.due = first_due
+        self.ticks = 0
+        self.late = 0
+        self.missed = 0
+        self.cost = 0.0
+        self.adapted = None     # расширенный интервал адаптивного режима
+        self.next_report = first_due + self.REPORT_PERIOD
+
+    @property
+    def interval(self):
+        return max(self.controller.interval, self.adapted or 0)
+
+    def done(self, started, finished):
+        cfg = self.controller.config_manager
+        interval = self.interval
+        self.ticks += 1
+        if started - self.due > self.LATE_FRACTION * interval:
+            self.late += 1
+        cost = finished - started
+        self.cost = cost if self.ticks == 1 else self.cost + self.EMA * (cost - self.cost)
+
+        if cfg.get('adaptive_interval', False):
+            self._adapt()
+
+        # Следующий дедлайн считается от прошлого, а не от конца такта. Просроченный такт идёт сразу;
+        # пропущенными считаются только те, от которых отстали на целый интервал и больше
+        self.due += self.interval
+        behind = int((finished - self.due) // self.interval)
+        if behind > 0:
+            self.missed += behind
+            self.due += behind * self.interval
+
+        if finished >= self.next_report:
+            self.next_report = finished + self.REPORT_PERIOD
+            self._report()
+
+    def _adapt(self):
+        base = self.controller.interval
+        tag = self.controller.config_manager.tag
+        if self.cost > 0.9 * self.interval:
+            self.adapted = round(self.cost * 1.25, 3)
+            logging.warning(f"{tag}Такт занимает {self.cost:.2f} с — интервал расширен до {self.adapted:.2f} с")
+            self._report()
+        elif self.adapted is not None and self.cost < 0.5 * base:
+            self.adapted = None
+            logging.info(f"{tag}Такт укладывается в интервал — возврат к {base:.2f} с")
+            self._report()
+
+    def _report(self):
+        self.controller.gui_queue.put(('tick_stats', self.ticks, self.late, self.missed, self.interval, self.cost))
+
+
+# ----------------------------------------------------------------------
+# Браузер: один Chrome на воркер, камеры — во вкладках
+# ----------------------------------------------------------------------
+class ScreencastReader:
+    """Поток DevTools Page.startScreencast одной вкладки: хранит только последний кадр"""
+    def __init__(self, ws_url, quality, tag=""):
+        self.ws_url = ws_url
+        self.quality = quality
+        self.tag = tag
+        self.ws = None
+        self.lock = threading.Lock()
+        self.frame = None          # base64 JPEG последнего кадра
+        self.metadata = None
+        self.frame_time = 0.0      # time.monotonic() прихода кадра
+        self.started = 0.0
+        self.alive = False
+
+    def start(self):
+        self.ws = websocket.create_connection(self.ws_url, suppress_origin=True, timeout=10)
+        self.ws.settimeout(None)
+        self.ws.send(json.dumps({
+            'id': 1, 'method': 'Page.startScreencast',
+            'params': {'format': 'jpeg', 'quality': self.quality, 'everyNthFrame': 1}
+        }))
+        self.alive = True
+        self.started = time.monotonic()
+        threading.Thread(target=self._run, daemon=True, name="screencast").start()
+
+    def _run(self):
+        ack_id = 2
+        try:
+            while self.alive:
+                msg = json.loads(self.ws.recv())
+                if msg.get('method') != 'Page.screencastFrame':
+                    continue
+                params = msg['params']
+                with self.lock:
+                    self.frame = params['data']
+                    self.metadata = params['metadata']
+                    self.frame_time = time.monotonic()
+                # Без подтверждения Chrome перестаёт слать кадры
+                self.ws.send(json.dumps({'id': ack_id, 'method': 'Page.screencastFrameAck',
+                                         'params': {'sessionId': params['sessionId']}}))
+                ack_id += 1
+        except Exception as e:
+            if self.alive:
+                logging.warning(f"{self.tag}Screencast остановлен: {e}")
+        self.alive = False
+
+    def latest(self):
+        """(jpeg_bytes, metadata, возраст кадра в секундах) или None"""
+        with self.lock:
+            if self.frame is None:
+                return None
+            data, metadata, frame_time = self.frame, self.metadata, self.frame_time
+        return base64.b64decode(data), metadata, time.monotonic() - frame_time
+
+    def stop(self):
+        self.alive = False
+        try: self.ws.close()
+        except: pass
+
+
+class StreamReader:
+    """Чтение потока камеры (HLS/MP4) через cv2.VideoCapture в фоне: хранит последний декодированный кадр"""
+    MAX_FAILURES = 5
+
+    def __init__(self, url, tag=""):
+        self.url = url
+        self.tag = tag
+        self.lock = threading.Lock()
+        self.frame = None          # BGR, как отдаёт OpenCV
+        self.frame_time = 0.0
+        self.started = 0.0
+        self.alive = False
+        self.expired = False       # ссылка перестала открываться — нужен браузер
+
+    def start(self):
+        self.alive = True
+        self.started = time.monotonic()
+        threading.Thread(target=self._run, daemon=True, name="stream-reader").start()
+
+    def _run(self):
+        failures = 0
+        while self.alive:
+            cap = cv2.VideoCapture(self.url)
+            if not cap.isOpened():
+                cap.release()
+                failures += 1
+                if failures >= self.MAX_FAILURES:
+                    logging.warning(f"{self.tag}Поток не открывается ({failures} попыток): {self.url}")
+                    self.expired = True
+                    break
+                time.sleep(min(30, 2 ** failures))
+                continue
+
+            failures = 0
+            # Файл (а не живой поток) читается быстрее реального времени — придерживаем по fps
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0
+            t0 = time.monotonic()
+            n = 0
+            while self.alive:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                with self.lock:
+                    self.frame = frame
+                    self.frame_time = time.monotonic()
+                n += 1
+                if 0 < fps <= 120:
+                    delay = t0 + n / fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            cap.release()
+            if n == 0:
+                # Открылось, но не отдало ни кадра — считаем неудачной попыткой, без горячего цикла
+                failures += 1
+                if failures >= self.MAX_FAILURES:
+                    logging.warning(f"{self.tag}Поток не отдаёт кадры ({failures} попыток): {self.url}")
+                    self.expired = True
+                    break
+                time.sleep(min(30, 2 ** failures))
+        self.alive = False
+
+    def latest(self):
+        """(кадр BGR, возраст в секундах) или None"""
+        with self.lock:
+            if self.frame is None:
+                return None
+            return self.frame, time.monotonic() - self.frame_time
+
+    def stop(self):
+        self.alive = False
+
+
+class BrowserPool:
+    """Учёт Chrome, запущенных этим приложением: PID деревьев процессов, перезапуски, память"""
+    PID_FILE = "browser_pids.json"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = []
+        self.counter = 0
+
+    def register(self, host):
+        with self.lock:
+            if host not in self.hosts:
+                self.counter += 1
+                host.name = f"chrome-{self.counter}"
+                self.hosts.append(host)
+            self._save()
+
+    def unregister(self, host):
+        with self.lock:
+            if host in self.hosts:
+                self.hosts.remove(host)
+            self._save()
+
+    def _save(self):
+        # Файл нужен, чтобы после аварийного завершения убить ровно свои процессы, а не все chrome.exe
+        records = [{'pid': h.pid, 'created': h.pid_created} for h in self.hosts if h.pid]
+        try:
+            with open(self.PID_FILE, 'w', encoding='utf-8') as f:
+                json.dump(records, f)
+        except Exception as e:
+            logging.warning(f"Не удалось записать {self.PID_FILE}: {e}")
+
+    def cleanup_orphans(self):
+        """Добивает chromedriver (с потомками), оставшиеся от прошлого запуска"""
+        if not os.path.exists(self.PID_FILE):
+            return
+        try:
+            with open(self.PID_FILE, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать {self.PID_FILE}: {e}")
+            records = []
+        for rec in records:
+            try:
+                proc = psutil.Process(rec['pid'])
+                # Проверка времени создания защищает от повторно выданного PID
+                if abs(proc.create_time() - rec['created']) < 1 and 'chromedriver' in proc.name().lower():
+                    kill_process_tree(rec['pid'])
+                    logging.info(f"Убит оставшийся от прошлого запуска chromedriver (PID: {rec['pid']})")
+            except psutil.NoSuchProcess:
+                pass
+            except Exception as e:
+                logging.warning(f"Не удалось завершить PID {rec.get('pid')}: {e}")
+        try: os.remove(self.PID_FILE)
+        except: pass
+
+    def stats(self):
+        with self.lock:
+            hosts = list(self.hosts)
+        return [h.stats() for h in hosts]
+
+    def shutdown(self):
+        with self.lock:
+            hosts = list(self.hosts)
+        for host in hosts:
+            host.quit()
+            self.unregister(host)
+
+
+BROWSER_POOL = BrowserPool()
+
+
+class BrowserHost:
+    BACKOFF_MAX = 120
+
+    def __init__(self, window_size="1920,1080"):
+        self.window_size = window_size
+        self.name = "chrome"
         self.driver = None
-        self.iframe_element = None
+        self.tabs = []
+        self.current_handle = None
+        self._blank_handle = None
+        self.pid = None
+        self.pid_created = None
+        self.started = 0.0
+        self.restarts = 0
+        self.failures = 0          # подряд неудачных перезапусков — растит паузу перед следующим
         self._setup_driver()
-        self._init_page()
-    
-    @property
-    def switch_to(self):
-        return self.driver.switch_to        
 
     def _setup_driver(self):
         chrome_options = Options()
         chrome_options.add_argument("--headless")
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument(f"--window-size={self.window_size}")
         chrome_options.add_argument("--disable-dev-shm-usage")
         chromedriver_path = os.path.join(sys._MEIPASS, "chromedriver.exe") if getattr(sys, 'frozen', False) else "chromedriver.exe"
         service = Service(executable_path=chromedriver_path)
         self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.driver.set_script_timeout(10)
+        self._blank_handle = self.driver.current_window_handle
+        self.current_handle = self._blank_handle
+
+        self.pid = self.driver.service.process.pid
+        try:
+            self.pid_created = psutil.Process(self.pid).create_time()
+        except psutil.NoSuchProcess:
+            self.pid_created = None
+        self.started = time.monotonic()
+        BROWSER_POOL.register(self)
+
+    def new_handle(self):
+        """Вкладка под камеру: первая занимает стартовое окно, остальные открываются заново"""
+        if self._blank_handle:
+            handle, self._blank_handle = self._blank_handle, None
+            self.activate(handle)
+        else:
+            self.driver.switch_to.new_window('tab')
+            handle = self.driver.current_window_handle
+            self.current_handle = handle
+        return handle
+
+    def activate(self, handle):
+        if self.current_handle != handle:
+            self.driver.switch_to.window(handle)
+            self.current_handle = handle
+
+    def _tree(self):
+        try:
+            root = psutil.Process(self.pid)
+            return [root] + root.children(recursive=True)
+        except (psutil.NoSuchProcess, TypeError, ValueError):
+            return []
+
+    def healthy(self):
+        """chromedriver жив, у него есть Chrome, и сессия отвечает"""
+        tree = self._tree()
+        try:
+            if len(tree) < 2 or tree[0].status() == psutil.STATUS_ZOMBIE:
+                return False
+            self.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def stats(self):
+        rss = 0
+        tree = self._tree()
+        for proc in tree:
+            try:
+                rss += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return {
+            'name': self.name,
+            'pid': self.pid,
+            'uptime': time.monotonic() - self.started if tree else 0,
+            'restarts': self.restarts,
+            'rss_mb': rss / (1024 * 1024),
+            'tabs': len(self.tabs),
+        }
+
+    def quit(self):
+        try: self.driver.quit()
+        except: pass
+        # Добиваем только своё дерево процессов, чужие Chrome не трогаем
+        if self.pid:
+            kill_process_tree(self.pid)
+
+    def restart(self):
+        self.quit()
+        # Экспоненциальная пауза: Chrome, падающий сразу после старта, не перезапускается в цикле
+        delay = min(self.BACKOFF_MAX, 2 * 2 ** self.failures)
+        time.sleep(delay)
+        self.restarts += 1
+        try:
+            self._setup_driver()
+        except Exception:
+            self.failures += 1
+            raise
+        self.failures = 0
+        for tab in self.tabs:
+            tab._open_tab()
+        logging.info(f"Браузер {self.name} перезапущен (№{self.restarts}), вкладок: {len(self.tabs)}")
+
+
+class BrowserDriver:
+    def __init__(self, config, host=None):
+        self.config = config
+        self.host = host if host is not None else BrowserHost()
+        self.handle = None
+        self.iframe_element = None
+        self.iframe_rect = None
+        self.in_frame = False      # контекст WebDriver остаётся внутри iframe между тактами
+        self.screencast = None
+        self.host.tabs.append(self)
+        self._open_tab()
+
+    @property
+    def driver(self):
+        if self.host.current_handle != self.handle:
+            # Переключение вкладки сбрасывает контекст на верхний документ
+            self.in_frame = False
+        self.host.activate(self.handle)
+        return self.host.driver
+
+    def enter_frame(self):
+        if not self.in_frame:
+            self.driver.switch_to.frame(self.iframe_element)
+            self.in_frame = True
+
+    def leave_frame(self):
+        if self.in_frame:
+            self.driver.switch_to.default_content()
+            self.in_frame = False
+
+    @property
+    def switch_to(self):
+        return self.driver.switch_to
+
+    def _open_tab(self):
+        self.stop_screencast()
+        self.handle = self.host.new_handle()
+        self._init_page()
 
     def _init_page(self):
+        self.iframe_rect = None
+        self.in_frame = False
         try:
             self.driver.get(self.config['adress_url'])
             WebDriverWait(self.driver, 20).until(EC.presence_of_element_located((By.ID, "ModalBodyPlayer")))
             self.iframe_element = WebDriverWait(self.driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "iframe")))
+            return True
         except Exception as e:
-            logging.error(f"Не загрузилась страница: {e}")
-            sys.exit(1)
+            # Не завершаем приложение: остальные камеры работают, эта поднимется через reload
+            logging.error(f"{self.config.tag}Не загрузилась страница: {e}")
+            self.iframe_element = None
+            return False
 
     def reload_via_url(self):
         try:
-            logging.info("Перезагрузка страницы")
+            logging.info(f"{self.config.tag}Перезагрузка страницы")
+            self.iframe_rect = None
+            self.in_frame = False
             self.driver.get(self.config['adress_url'])
             self.driver.refresh()
             time.sleep(1)
             WebDriverWait(self.driver, 25).until(EC.presence_of_element_located((By.ID, "ModalBodyPlayer")))
             self.iframe_element = WebDriverWait(self.driver, 25).until(EC.presence_of_element_located((By.TAG_NAME, "iframe")))
             if not self.iframe_element.get_attribute("src") or "about:blank" in self.iframe_element.get_attribute("src"):
-                logging.warning("iframe src пустой")
+                logging.warning(f"{self.config.tag}iframe src пустой")
                 return False
             return True
         except Exception as e:
-            logging.error(f"Ошибка перезагрузки: {e}")
+            logging.error(f"{self.config.tag}Ошибка перезагрузки: {e}")
             return False
 
     def restart(self):
-        try: self.driver.quit()
-        except: pass
-        cleanup_processes()
-        time.sleep(2)
-        self._setup_driver()
-        self._init_page()
-        logging.info("Драйвер перезапущен")
+        self.host.restart()
+        logging.info(f"{self.config.tag}Драйвер перезапущен")
 
     def get_iframe_size(self):
         try:
+            self.leave_frame()
             return self.driver.execute_script("return arguments[0].getBoundingClientRect()", self.iframe_element)
         except Exception as e:
-            logging.warning(f"Ошибка get_iframe_size: {e}")
+            logging.warning(f"{self.config.tag}Ошибка get_iframe_size: {e}")
+            return None
+
+    def get_iframe_rect(self):
+        """Прямоугольник iframe, кешируется до перезагрузки страницы"""
+        if self.iframe_rect is None:
+            self.iframe_rect = self.get_iframe_size()
+        return self.iframe_rect
+
+    def resolve_stream_url(self):
+        """Адрес потока, который играет <video> в iframe (или последний запрошенный m3u8/mp4)"""
+        self.enter_frame()
+        return self.driver.execute_script(STREAM_URL_JS)
+
+    def probe(self):
+        """Один execute_script на такт: размер iframe, состояние <video> и сам элемент video"""
+        try:
+            self.enter_frame()
+            info, video = self.driver.execute_script(PROBE_JS)
+        except Exception as e:
+            logging.warning(f"{self.config.tag}Ошибка проверки видео: {e}")
+            self.in_frame = False
             return None
+        info['video'] = video
+        return info
+
+    def park(self):
+        """Уводит вкладку на about:blank, чтобы Chrome не декодировал видео впустую"""
+        try:
+            self.stop_screencast()
+            self.driver.get("about:blank")
+            self.in_frame = False
+        except Exception as e:
+            logging.warning(f"{self.config.tag}Не удалось освободить вкладку: {e}")
+        self.iframe_element = None
+        self.iframe_rect = None
+
+    def start_screencast(self, quality):
+        self.stop_screencast()
+        address = self.host.driver.capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+        if not address:
+            raise RuntimeError("Chrome не сообщил debuggerAddress")
+        # Дескриптор окна chromedriver совпадает с targetId вкладки в DevTools
+        self.screencast = ScreencastReader(f"ws://{address}/devtools/page/{self.handle}", quality, self.config.tag)
+        self.screencast.start()
+        logging.info(f"{self.config.tag}Screencast запущен")
+
+    def stop_screencast(self):
+        if self.screencast is not None:
+            self.screencast.stop()
+            self.screencast = None
 
     def capture_frame(self, file_path):
         try:
@@ -252,187 +958,720 @@ class BrowserDriver:
                 self.driver.switch_to.default_content()
             return True
         except Exception as e:
-            logging.warning(f"Ошибка захвата кадра: {e}")
+            logging.warning(f"{self.config.tag}Ошибка захвата кадра: {e}")
             return False
 
 
+# Выполняется внутри iframe: размер окна iframe совпадает с размером самого iframe
+PROBE_JS = """
+const info = {width: window.innerWidth, height: window.innerHeight};
+const video = document.querySelector('video');
+if (!video) return [info, null];
+const quality = video.getVideoPlaybackQuality ? video.getVideoPlaybackQuality() : null;
+Object.assign(info, {
+    readyState: video.readyState,
+    currentTime: video.currentTime,
+    paused: video.paused,
+    videoWidth: video.videoWidth,
+    videoHeight: video.videoHeight,
+    droppedFrames: quality ? quality.droppedVideoFrames : 0,
+    totalFrames: quality ? quality.totalVideoFrames : 0
+});
+return [info, video];
+"""
+
+# Выполняется внутри iframe: blob:-адрес MSE-плеера не годится, тогда ищем запросы к m3u8/mp4
+STREAM_URL_JS = """
+const video = document.querySelector('video');
+if (video && video.currentSrc && !video.currentSrc.startsWith('blob:')) return video.currentSrc;
+const urls = performance.getEntriesByType('resource').map(e => e.name)
+    .filter(n => /\\.(m3u8|mp4)(\\?|$)/.test(n));
+return urls.length ? urls[urls.length - 1] : null;
+"""
+
+# Выполняется внутри iframe; последний аргумент — callback execute_async_script
+CANVAS_GRAB_JS = """
+const done = arguments[arguments.length - 1];
+const quality = arguments[0];
+const video = document.querySelector('video');
+if (!video || !video.videoWidth || video.readyState < 2) { done(null); return; }
+try {
+    const canvas = new OffscreenCanvas(video.videoWidth, video.videoHeight);
+    canvas.getContext('2d').drawImage(video, 0, 0);
+    canvas.convertToBlob({type: 'image/jpeg', quality: quality}).then(blob => {
+        const reader = new FileReader();
+        reader.onload = () => done(reader.result.split(',')[1]);
+        reader.onerror = () => done('ERR:' + reader.error);
+        reader.readAsDataURL(blob);
+    }).catch(e => done('ERR:' + e));
+} catch (e) {
+    done('ERR:' + e);
+}
+"""
+
+
+# ----------------------------------------------------------------------
+# Горячий резерв: запасной браузер с уже загруженной страницей камеры
+# ----------------------------------------------------------------------
+class HotStandby:
+    CHECK_PERIOD = 30
+
+    def __init__(self, config, window_size):
+        self.config = config
+        self.window_size = window_size
+        self.lock = threading.Lock()
+        self.spare = None
+        self.recycle_queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True, name="hot-standby").start()
+
+    def take(self):
+        """Готовый запасной браузер или None; не блокирует такт"""
+        with self.lock:
+            spare, self.spare = self.spare, None
+        return spare
+
+    def recycle(self, driver):
+        """Сломавшийся браузер уходит в фон: перезагрузка, при неудаче — перезапуск Chrome"""
+        self.recycle_queue.put(driver)
+
+    def _put_spare(self, driver):
+        with self.lock:
+            if self.spare is None:
+                self.spare = driver
+                return
+        driver.host.quit()
+        BROWSER_POOL.unregister(driver.host)
+
+    def _restore(self, driver):
+        driver.stop_screencast()
+        if driver.reload_via_url():
+            return driver
+        try:
+            driver.restart()
+            if driver.iframe_element is not None:
+                return driver
+            logging.error(f"{self.config.tag}Запасной браузер не восстановлен: страница не загрузилась")
+        except Exception as e:
+            logging.error(f"{self.config.tag}Запасной браузер не восстановлен: {e}")
+        driver.host.quit()
+        BROWSER_POOL.unregister(driver.host)
+        return None
+
+    def _run(self):
+        pending = None
+        while True:
+            if self.spare is None and pending is None:
+                try:
+                    pending = BrowserDriver(self.config, BrowserHost(self.window_size))
+                except Exception as e:
+                    logging.error(f"{self.config.tag}Не удалось поднять запасной браузер: {e}")
+                    time.sleep(self.CHECK_PERIOD)
+                    continue
+            if pending is not None:
+                self._put_spare(pending)
+                pending = None
+                logging.info(f"{self.config.tag}Запасной браузер готов")
+
+            try:
+                failed = self.recycle_queue.get(timeout=self.CHECK_PERIOD)
+            except queue.Empty:
+                # Простаивающий резерв тоже проверяем: подсовывать битую страницу нельзя
+                spare = self.take()
+                if spare is None:
+                    continue
+                info = spare.probe()
+                if info and info['width'] >= 132 and info.get('readyState', 4) >= 2:
+                    self._put_spare(spare)
+                else:
+                    pending = self._restore(spare)
+                continue
+            pending = self._restore(failed)
+
+
 # ----------------------------------------------------------------------
 # ОПТИМАЛЬНЫЙ ЗАХВАТ: JPG напрямую, без временных файлов и предупреждений
 # ----------------------------------------------------------------------
 class FrameCapture:
+    SKIPPED = "skipped"     # результат process: кадр без изменений пропущен режимом движения
+
     def __init__(self, config, driver):
         self.config = config
         self.driver = driver
+        self.driver_factory = None   # ленивое создание вкладки для камер без браузера
         self.last_file = None
-        self.last_two_sizes = []  # Новый атрибут: размеры двух последних успешных кадров
+        self.last_stamp = None           # время в имени последнего кадра, с точностью до мс
+        self.stream = None
+        self.stream_fallback_until = 0.0
+        self.video_stats = None          # последний ответ probe
+        self.last_video_time = None      # currentTime видео на последнем снятом кадре
+        self.video_stuck_since = 0.0
+        self.playback_checked = False    # на этом такте у кадра есть <video> с проверкой currentTime
+        self.standby = None              # HotStandby, если для камеры включён горячий резерв
+        self.writer = None               # FrameWriter; None — кодирование прямо в потоке захвата
+        self.recover_reason = None       # отказ, найденный воркером записи
+        self.segments = None             # SegmentEncoder в режиме video_mode: streaming
+        self.ring = None                 # FrameRing: последние принятые кадры в общей памяти
+        self.pack = None                 # PackWriter текущего дня при frame_storage: pack
+        self.pack_lock = threading.Lock()
+        self.health = FrameHealth(config)
+        self.motion = MotionDetector(config)
+        self.jpeg = QualityController(config)
 
-    def count_existing_frames(self):
-        date_str = datetime.now().strftime("%Y%m%d")
-        folder = os.path.join("capture", date_str)
-        if not os.path.exists(folder):
-            return 0
-        return len([f for f in os.listdir(folder) if f.startswith("capt-") and f.endswith(".jpg")])
+    @property
+    def browserless(self):
+        """Режим stream с адресом из конфига — браузер не нужен, пока поток жив"""
+        return self.config.get('capture_mode', 'element') == 'stream' and bool(self.config.get('stream_url'))
+
+    def _ensure_driver(self):
+        if self.driver is None:
+            self.driver = self.driver_factory()
+        return self.driver
+
+    def _stream_active(self):
+        return self.config.get('capture_mode', 'element') == 'stream' and time.monotonic() >= self.stream_fallback_until
+
+    def _recover(self):
+        """Реакция на плохой кадр: в режиме stream — переподключить поток, иначе перезагрузить страницу"""
+        if self._stream_active() and self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+        else:
+            self._reload_page()
+            self.last_video_time = None
+        time.sleep(0.2)
+
+    def _reload_page(self):
+        """Перезагрузка страницы; с горячим резервом — мгновенная подмена браузера готовым запасным"""
+        if self.standby is not None:
+            spare = self.standby.take()
+            if spare is not None:
+                failed, self.driver = self.driver, spare
+                self.standby.recycle(failed)
+                logging.warning(f"{self.config.tag}Переключение на запасной браузер")
+                return
+        self._ensure_driver().reload_via_url()
+
+    def _start_stream_fallback(self, reason):
+        retry = float(self.config.get('stream_retry_sec', 60))
+        logging.warning(f"{self.config.tag}{reason} → захват через браузер на {retry:.0f} с")
+        self.stream_fallback_until = time.monotonic() + retry
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+        self._ensure_driver()
+        self._reload_page()
+
+    def _resolve_stream_url(self):
+        url = self.config.get('stream_url')
+        if url:
+            return url
+        driver = self._ensure_driver()
+        if driver.iframe_element is None:
+            driver.reload_via_url()
+        url = driver.resolve_stream_url()
+        if url:
+            logging.info(f"{self.config.tag}Адрес потока: {url}")
+            driver.park()
+        return url
+
+    def _grab_stream(self):
+        """Последний BGR-кадр из StreamReader; None — кадра на этом такте нет"""
+        if self.stream is None:
+            url = self._resolve_stream_url()
+            if not url:
+                self._start_stream_fallback("Адрес потока не найден")
+                return None
+            self.stream = StreamReader(url, self.config.tag)
+            self.stream.start()
+            return None
 
-    def capture(self):
-        now = datetime.now()
-        date_str = now.strftime("%Y%m%d")
-        time_str = now.strftime("%H-%M-%S")
-        filename = f"capt-{date_str}_{time_str}.jpg"
-        folder = os.path.join("capture", date_str)
-        os.makedirs(folder, exist_ok=True)
-        file_path = os.path.join(folder, filename)
+        if self.stream.expired:
+            self._start_stream_fallback("Ссылка на поток устарела")
+            return None
 
-        try:
-            # Проверка размера iframe
-            size = self.driver.get_iframe_size()
-            if not size or size['width'] < 132:
-                logging.warning("iframe слишком узкий или пустой → перезагрузка")
-                self.driver.reload_via_url()
-                time.sleep(0.2)
-                return False
+        stale = float(self.config.get('stream_stale_sec', 10.0))
+        frame = self.stream.latest()
+        age = frame[1] if frame else time.monotonic() - self.stream.started
+        if age > stale:
+            self._start_stream_fallback(f"Поток без новых кадров {age:.1f} с")
+            return None
+        if frame is None:
+            return None
+        return frame[0]
+
+    def day_folder(self, date_str=None):
+        if date_str is None:
+            date_str = datetime.now().strftime("%Y%m%d")
+        return os.path.join(self.config.capture_dir, date_str)
+
+    def _pack_writer(self, folder):
+        with self.pack_lock:
+            if self.pack is None or self.pack.folder != folder:
+                if self.pack is not None:
+                    self.pack.close()
+                self.pack = PackWriter(folder)
+            return self.pack
+
+    def close_pack(self, folder=None):
+        """Перед кодированием дня: пакет закрывается, чтобы его можно было удалить после видео.
+        folder — только если открыт пакет этого дня: в сегодняшний прямо сейчас пишут воркеры"""
+        with self.pack_lock:
+            if self.pack is not None and (folder is None or
+                                          os.path.normpath(self.pack.folder) == os.path.normpath(folder)):
+                self.pack.close()
+                self.pack = None
+
+    def count_existing_frames(self):
+        folder = self.day_folder()
+        if self.segments is not None and not self.config.get('keep_frames', True):
+            # JPEG не сохраняются — кадры дня живут только в сегментах
+            return self.segments.frame_count(folder)
+        index = day_index(folder)
+        return index.count() if index is not None else 0
+
+    def _quality(self):
+        return self.jpeg.current()
+
+    def _check_video(self):
+        """Проверка страницы одним probe. Возвращает элемент video (или True, если его нет) либо None — кадр не снимаем"""
+        info = self.driver.probe()
+        if not info or info['width'] < 132:
+            logging.warning(f"{self.config.tag}iframe слишком узкий или пустой → перезагрузка")
+            self._recover()
+            return None
+        self.video_stats = info
+        if info['video'] is None:
+            return True
 
-            # === КЛЮЧЕВОЙ ТРЮК: используем screenshot_as_png + сохраняем через PIL как JPG ===
-            self.driver.switch_to.frame(self.driver.iframe_element)
+        # Зависание — currentTime не растёт; такой кадр — дубликат, его не снимаем
+        now = time.monotonic()
+        playing = info['readyState'] >= 2 and not info['paused']
+        if self.last_video_time is None or (playing and info['currentTime'] != self.last_video_time):
+            self.last_video_time = info['currentTime']
+            self.video_stuck_since = now
+            return info['video']
+
+        stuck = now - self.video_stuck_since
+        if stuck > float(self.config.get('freeze_sec', 3.0)):
+            logging.warning(
+                f"{self.config.tag}Видео стоит {stuck:.1f} с (currentTime={info['currentTime']:.2f}, "
+                f"readyState={info['readyState']}, paused={info['paused']}) → перезагрузка"
+            )
+            self._recover()
+        return None
+
+    def _grab_element(self, video):
+        """PNG-скриншот video, найденного probe; без video — скриншот самого iframe"""
+        png_data = None
+        if video is not True:
             try:
-                video = WebDriverWait(self.driver, 4).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "video"))
-                )
                 png_data = video.screenshot_as_png
-            except:
-                self.driver.switch_to.default_content()
-                png_data = self.driver.iframe_element.screenshot_as_png
-            finally:
-                self.driver.switch_to.default_content()
+            except Exception:
+                png_data = None
+        if png_data is None:
+            self.driver.leave_frame()
+            png_data = self.driver.iframe_element.screenshot_as_png
+        return png_data
+
+    def _grab_screencast(self):
+        """Последний кадр screencast и прямоугольник iframe в нём — без обращений к WebDriver на такте"""
+        cast = self.driver.screencast
+        if cast is None or not cast.alive:
+            self.driver.start_screencast(self._quality())
+            return None
+
+        stale = float(self.config.get('screencast_stale_sec', 5.0))
+        frame = cast.latest()
+        age = frame[2] if frame else time.monotonic() - cast.started
+        if age > stale:
+            logging.warning(f"{self.config.tag}Screencast без новых кадров {age:.1f} с → перезагрузка")
+            self._recover()
+            return None
+        if frame is None:
+            return None
 
-            # Открываем PNG из памяти
-            img = Image.open(io.BytesIO(png_data))
+        rect = self.driver.get_iframe_rect()
+        if not rect or rect['width'] < 132:
+            logging.warning(f"{self.config.tag}iframe слишком узкий или пустой → перезагрузка")
+            self._recover()
+            return None
 
+        # Кадр screencast — весь viewport; iframe задаём долями кадра, в пиксели переведёт воркер
+        data, metadata, _ = frame
+        dw, dh = metadata['deviceWidth'], metadata['deviceHeight']
+        top = rect['top'] + metadata.get('offsetTop', 0)
+        box = (rect['left'] / dw, top / dh, (rect['left'] + rect['width']) / dw, (top + rect['height']) / dh)
+        return data, box
+
+    def _grab_cdp_jpeg(self):
+        """JPEG прямо из Chrome: Page.captureScreenshot по прямоугольнику iframe минус боковые панели"""
+        rect = self.driver.get_iframe_rect()
+        if not rect or rect['width'] < 132:
+            logging.warning(f"{self.config.tag}iframe слишком узкий или пустой → перезагрузка")
+            self._recover()
+            return None
+        crop = int(self.config.get('crop_sides', 66))
+        result = self.driver.driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'jpeg',
+            'quality': self._quality(),
+            'clip': {
+                'x': rect['left'] + crop, 'y': rect['top'],
+                'width': rect['width'] - 2 * crop, 'height': rect['height'],
+                'scale': 1
+            }
+        })
+        return base64.b64decode(result['data'])
+
+    def _grab_canvas_jpeg(self):
+        """Текущий кадр <video> в родном разрешении: OffscreenCanvas внутри iframe → JPEG"""
+        self.driver.enter_frame()
+        result = self.driver.driver.execute_async_script(CANVAS_GRAB_JS, self._quality() / 100)
+        if not result:
+            raise RuntimeError("video ещё не готов")
+        if result.startswith('ERR:'):
+            # Например, SecurityError: видео без CORS «пачкает» canvas
+            raise RuntimeError(result[4:])
+        return base64.b64decode(result)
+
+    def _acquire(self, file_path):
+        """Только получение сырых данных кадра (работа с браузером/потоком). None — кадра нет"""
+        mode = self.config.get('capture_mode', 'element')
+        if mode != 'stream' and self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+        if mode != 'screencast' and self.driver is not None and self.driver.screencast is not None:
+            # Режим сменили в настройках — Chrome не должен дальше слать кадры впустую
+            self.driver.stop_screencast()
+
+        # Страница нужна всем режимам, кроме screencast и живого потока
+        video = None
+        self.playback_checked = False
+        if mode != 'screencast' and not self._stream_active():
+            video = self._check_video()
+            if video is None:
+                return None
+            self.playback_checked = video is not True
+
+        if mode in ('cdp_jpeg', 'canvas'):
+            try:
+                jpeg = self._grab_cdp_jpeg() if mode == 'cdp_jpeg' else self._grab_canvas_jpeg()
+            except Exception as e:
+                # Запасной путь — PNG через PIL, как в режиме element
+                logging.warning(f"{self.config.tag}Захват {mode} не сработал ({e}) → PIL")
+            else:
+                return FrameJob(self, file_path, data=jpeg, passthrough=True) if jpeg is not None else None
+
+        if mode == 'stream' and self._stream_active():
+            array = self._grab_stream()
+            return FrameJob(self, file_path, array=array) if array is not None else None
+
+        if mode == 'screencast':
+            grabbed = self._grab_screencast()
+            if grabbed is None:
+                return None
+            data, box = grabbed
+            return FrameJob(self, file_path, data=data, box=box, crop=int(self.config.get('crop_sides', 66)))
+
+        return FrameJob(self, file_path, data=self._grab_element(video), crop=int(self.config.get('crop_sides', 66)))
+
+    def process(self, job):
+        """Проверка, кроп, кодирование и запись кадра. Возвращает причину отказа, SKIPPED или None"""
+        if job.passthrough:
+            # Для проверок хватает JPEG, декодированного в 1/8 масштаба (DCT-scaling, почти бесплатно)
+            img = Image.open(io.BytesIO(job.data))
+            w, h = img.size
+            img.draft('RGB', (w // 8, h // 8))
+        else:
+            if job.array is not None:
+                img = Image.fromarray(cv2.cvtColor(job.array, cv2.COLOR_BGR2RGB))
+            else:
+                img = Image.open(io.BytesIO(job.data))
             # Конвертируем в RGB (убираем альфу)
             if img.mode != "RGB":
                 img = img.convert("RGB")
-
+            if job.box is not None:
+                bx = job.box
+                img = img.crop((round(bx[0] * img.width), round(bx[1] * img.height),
+                                round(bx[2] * img.width), round(bx[3] * img.height)))
             w, h = img.size
-            if w < 132:
-                logging.warning(f"Узкий кадр w={w} → перезагрузка")
-                self.driver.reload_via_url()
-                time.sleep(0.2)
-                return False
 
-            if is_image_black(img):
-                logging.warning("Чёрный кадр → перезагрузка")
-                self.driver.reload_via_url()
-                time.sleep(0.2)
-                return False
+        if w < 132:
+            return f"Узкий кадр w={w}"
 
-            # Кроп боковых панелей
-            cropped = img.crop((66, 0, w-66, h))
+        reason, health = self.health.check(img, freeze=not job.playback)
+        if reason:
+            return reason
 
-            # Качество из конфига
-            quality = int(self.config.config.get('image_quality', 92))
-            quality = max(75, min(100, quality))
+        if self.motion.enabled:
+            keep, _ = self.motion.update(health['gray'])
+            if not keep:
+                # Сцена не изменилась — кадр не пишется, только учитывается в статистике
+                return self.SKIPPED
 
-            # Сохраняем как JPG
-            cropped.save(file_path, "JPEG", quality=quality, optimize=True, progressive=True)
+        jpeg = job.data
+        if not job.passthrough:
+            # Кроп боковых панелей (у кадров самого потока их нет)
+            cropped = img.crop((job.crop, 0, w - job.crop, h))
+            jpeg = self.jpeg.encode(cropped)
+        else:
+            self.jpeg.observe(len(jpeg))
 
-            # НОВАЯ ПРОВЕРКА: сравнение размера с двумя предыдущими
-            size = os.path.getsize(file_path)
-            if len(self.last_two_sizes) == 2 and size == self.last_two_sizes[0] and size == self.last_two_sizes[1]:
-                logging.warning("Размеры последних трех кадров одинаковые → перезагрузка")
-                os.remove(file_path)
-                self.driver.reload_via_url()
-                time.sleep(0.2)
-                return False
+        # Прежний признак плохого кадра — размер JPEG; теперь по умолчанию выключен, решает FrameHealth
+        min_kb = float(self.config.get('min_jpeg_kb', 0))
+        if min_kb > 0 and len(jpeg) < min_kb * 1024:
+            return "JPG слишком маленький"
+
+        if self.segments is not None or self.ring is not None:
+            if job.passthrough:
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            else:
+                frame = cv2.cvtColor(np.asarray(cropped), cv2.COLOR_RGB2BGR)
+            if self.ring is not None:
+                # Декодированный кадр — в общую память для потребителей без диска и копий
+                self.ring.write(frame)
+            if self.segments is not None:
+                # Потоковое видео: кадр сразу уходит в текущий сегмент
+                self.segments.add(job.file_path, frame)
+                if not self.config.get('keep_frames', True):
+                    return None
+
+        folder, name = os.path.split(job.file_path)
+        if self.config.get('frame_storage', 'files') == 'pack':
+            self._pack_writer(folder).append(jpeg, frame_time(name))
+        else:
+            with open(job.file_path, 'wb') as f:
+                f.write(jpeg)
+        day_index(folder).add(name, len(jpeg), health['hash'])
+
+        # Воркеры пишут параллельно — last_file не должен откатываться назад
+        if self.last_file is None or job.file_path > self.last_file:
+            self.last_file = job.file_path
+        return None
+
+    def capture(self):
+        now = datetime.now()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        if self.last_stamp is not None and now <= self.last_stamp:
+            # Та же миллисекунда или перевод часов назад: имя не повторяется и не уходит назад
+            now = self.last_stamp + timedelta(milliseconds=1)
+        self.last_stamp = now
+        date_str = now.strftime("%Y%m%d")
+        # Миллисекунды в имени: при интервале меньше секунды кадры не перезаписывают друг друга
+        time_str = now.strftime("%H-%M-%S") + f"-{now.microsecond // 1000:03d}"
+        filename = f"capt-{date_str}_{time_str}.jpg"
+        folder = self.day_folder(date_str)
+        os.makedirs(folder, exist_ok=True)
+        file_path = os.path.join(folder, filename)
+
+        # Отказ, найденный воркером записи на прошлых кадрах, обрабатываем в потоке захвата
+        reason, self.recover_reason = self.recover_reason, None
+        if reason:
+            self._recover()
+            return False
 
-            # Проверка размера (существующая)
-            if os.path.getsize(file_path) < 70 * 1024:
-                os.remove(file_path)
-                logging.warning("JPG слишком маленький → перезагрузка")
-                self.driver.reload_via_url()
-                time.sleep(0.2)
+        try:
+            job = self._acquire(file_path)
+            if job is None:
                 return False
+            job.playback = self.playback_checked
 
-            # Если все проверки пройдены, обновляем список размеров
-            self.last_two_sizes.append(size)
-            if len(self.last_two_sizes) > 2:
-                self.last_two_sizes = self.last_two_sizes[-2:]
+            if self.writer is not None:
+                return self.writer.submit(job)
 
-            self.last_file = file_path
+            reason = self.process(job)
+            if reason and reason != self.SKIPPED:
+                logging.warning(f"{self.config.tag}{reason} → перезагрузка")
+                self._recover()
+                return False
             return True
 
         except Exception as e:
-            logging.error(f"Ошибка захвата кадра: {e}")
+            logging.error(f"{self.config.tag}Ошибка захвата кадра: {e}")
             try: os.remove(file_path)
             except: pass
-            self.driver.reload_via_url()
-            time.sleep(0.2)
+            self._recover()
             return False
 
 
+class FrameJob:
+    """Сырые данные одного кадра: от потока захвата к воркеру записи"""
+    def __init__(self, owner, file_path, data=None, array=None, box=None, crop=0, passthrough=False):
+        self.owner = owner
+        self.file_path = file_path
+        self.data = data                # PNG/JPEG как пришли из браузера
+        self.array = array              # BGR-кадр из потока
+        self.box = box                  # доли кадра (x0, y0, x1, y1) — вырезка iframe из screencast
+        self.crop = crop                # боковые панели, px
+        self.passthrough = passthrough  # готовый JPEG — пишется как есть
+        self.playback = False           # зависание уже проверено по currentTime видео
+
+
 # ----------------------------------------------------------------------
-# Видеокодер — теперь ищет .jpg
+# Конвейер записи: кодирование и диск — в пуле потоков, с ограниченной очередью
 # ----------------------------------------------------------------------
-class VideoEncoder:
-    def __init__(self, config, gui_queue, frame_capture):
-        self.config = config
-        self.gui_queue = gui_queue
-        self.frame_capture = frame_capture  # нужен для доступа к папке
+class FrameWriter:
+    def __init__(self, workers=2, max_queue=8, policy='drop_oldest'):
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.jobs = collections.deque()
+        self.cond = threading.Condition()
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.skipped = 0
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._run, daemon=True, name=f"frame-writer-{i}").start()
+
+    def submit(self, job):
+        """Кладёт кадр в очередь, не блокируя захват. При переполнении — политика policy"""
+        with self.cond:
+            if len(self.jobs) >= self.max_queue:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    logging.warning(f"Запись не успевает: отброшено кадров {self.dropped} ({self.policy})")
+                if self.policy == 'drop_newest':
+                    return False
+                self.jobs.popleft()
+            self.jobs.append(job)
+            self.cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.jobs:
+                    self.cond.wait()
+                job = self.jobs.popleft()
+            owner = job.owner
+            try:
+                reason = owner.process(job)
+            except Exception as e:
+                reason = f"Ошибка обработки кадра: {e}"
+            if reason == FrameCapture.SKIPPED:
+                self.skipped += 1
+            elif reason:
+                self.rejected += 1
+                logging.warning(f"{owner.config.tag}{reason} → перезагрузка")
+                owner.recover_reason = reason
+            else:
+                self.written += 1
 
-    def _get_video_path(self, date_str):
-        folder = os.path.join("capture", date_str)
-        os.makedirs(folder, exist_ok=True)
-        return os.path.join(folder, f"video-{date_str}.mp4")
+    def stats(self):
+        with self.cond:
+            queued = len(self.jobs)
+        return {'queued': queued, 'written': self.written, 'dropped': self.dropped, 'rejected': self.rejected,
+                'skipped': self.skipped}
 
-    def encode(self, date_str):
-        """Создаёт видео из всех JPG-кадров за указанную дату"""
-        folder = os.path.join("capture", date_str)
-        pattern = os.path.join(folder, "capt-*.jpg")
-        frames = sorted(glob.glob(pattern))
 
-        if not frames:
-            logging.info(f"Нет JPG-кадров для конвертации за {date_str}")
-            self.gui_queue.put(('video_done', "Нет кадров для видео"))
-            return
+# ----------------------------------------------------------------------
+# Очередь заданий кодирования
+# ----------------------------------------------------------------------
+class EncodeQueue:
+    """Задания на кодирование в файле на диске: переживают закрытие программы и сбой.
+    Сегодняшний день (приоритет 0) — сразу и в полную силу, пропущенные дни (1) — в фоне с паузами."""
+    JOBS_FILE = "encode_jobs.json"
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = 60
+
+    def __init__(self, encoders, process=None):
+        self.encoders = encoders
+        self.process = process       # EncodeProcess; None — кодирование в потоке очереди
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.jobs = self._load()
 
-        # Читаем первый кадр для размеров
-        first_frame = cv2.imread(frames[0])
-        if first_frame is None:
-            logging.error("Не удалось прочитать первый кадр")
-            return
-        h, w = first_frame.shape[:2]
-
-        video_path = self._get_video_path(date_str)
-        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'),
-                                 self.config['video_fps'], (w, h))
-
-        total = len(frames)
-        self.gui_queue.put(('video_prepare',))
-        self.gui_queue.put(('video_start', total))
-
-        for i, jpg_path in enumerate(frames):
-            frame = cv2.imread(jpg_path)
-            if frame is not None:
-                writer.write(frame)
-            # Обновляем прогресс реже — чтобы GUI не тормозил
-            if (i + 1) % 10 == 0 or i == total - 1:
-                self.gui_queue.put(('video_progress', i + 1, total))
-
-        writer.release()
-
-        summary = f"Видео создано: video-{date_str}.mp4 ({total} кадров)"
-        self.gui_queue.put(('video_done', summary))
-        logging.info(summary)
-
-        # Удаление кадров после конвертации
-        if self.config.get('delete_frames_after_video', False):
-            deleted = 0
-            for p in frames:
-                try:
-                    os.remove(p)
-                    deleted += 1
-                except:
-                    pass
-            logging.info(f"Удалено {deleted}/{total} JPG-кадров")
-            self.gui_queue.put(('delete_done', deleted))
+    def _load(self):
+        if not os.path.exists(self.JOBS_FILE):
+            return []
+        try:
+            with open(self.JOBS_FILE, 'r', encoding='utf-8') as f:
+                jobs = json.load(f)
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать {self.JOBS_FILE}: {e}")
+            return []
+        # Камеры могли убрать из конфига
+        return [job for job in jobs if job.get('camera') in self.encoders]
+
+    def _save(self):
+        tmp = self.JOBS_FILE + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.jobs, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.JOBS_FILE)
+
+    def put(self, camera, date_str, priority=0):
+        with self.lock:
+            for job in self.jobs:
+                if job['camera'] == camera and job['date'] == date_str:
+                    job['priority'] = min(job['priority'], priority)
+                    break
+            else:
+                self.jobs.append({'camera': camera, 'date': date_str, 'priority': priority, 'attempts': 0})
+            self._save()
+        self.wakeup.set()
+
+    def scan(self):
+        """Дни до сегодняшнего, где есть кадры, но нет готового видео"""
+        today = datetime.now().strftime("%Y%m%d")
+        found = 0
+        for camera, encoder in self.encoders.items():
+            root = encoder.config.capture_dir
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if not entry.is_dir() or len(entry.name) != 8 or not entry.name.isdigit() or entry.name >= today:
+                    continue
+                if os.path.exists(os.path.join(entry.path, f"video-{entry.name}.mp4")):
+                    continue
+                has_frames = any(f.name.startswith("capt-") and f.name.endswith(".jpg") for f in os.scandir(entry.path))
+                if has_frames or pack_frame_count(entry.path) or read_segments(entry.path):
+                    self.put(camera, entry.name, priority=1)
+                    found += 1
+        if found:
+            logging.info(f"Найдено дней без видео: {found} — поставлены в очередь кодирования")
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="encode-queue").start()
+
+    def _next(self):
+        with self.lock:
+            if not self.jobs:
+                return None
+            return min(self.jobs, key=lambda job: (job['priority'], job['date']))
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            encoder = self.encoders[job['camera']]
+            logging.info(f"{encoder.config.tag}Кодирование за {job['date']}" + (" (фон)" if job['priority'] else ""))
+            try:
+                folder = encoder.frame_capture.day_folder(job['date'])
+                encoder.frame_capture.close_pack(folder)
+                if self.process is not None:
+                    # Сегменты пишет этот процесс — закрыть их нужно до передачи дня кодировщику
+                    segments = encoder.frame_capture.segments
+                    if segments is not None:
+                        segments.close(folder)
+                    ok = self.process.run(JobConfig(encoder.config), job['date'], job['priority'] > 0, encoder.gui_queue)
+                else:
+                    ok = encoder.encode(job['date'], background=job['priority'] > 0)
+            except Exception as e:
+                logging.error(f"{encoder.config.tag}Сбой кодирования за {job['date']}: {e}")
+                ok = False
+
+            with self.lock:
+                job['attempts'] += 1
+                if ok or job['attempts'] >= self.MAX_ATTEMPTS:
+                    if not ok:
+                        logging.error(f"{encoder.config.tag}Кодирование за {job['date']} снято после {job['attempts']} попыток")
+                    self.jobs.remove(job)
+                self._save()
+            if not ok:
+                time.sleep(self.RETRY_DELAY)
 
 
 # ----------------------------------------------------------------------
@@ -447,11 +1686,51 @@ class ConfigManager:
         'time_video': '19:05',
         'video_fps': 60,
         'delete_frames_after_video': True,
-        'image_quality': 92
+        'image_quality': 92,
+        'max_browsers': 2,
+        'capture_mode': 'element',
+        'screencast_stale_sec': 5.0,
+        'crop_sides': 66,
+        'window_size': '1920,1080',
+        'stream_url': '',
+        'stream_stale_sec': 10.0,
+        'stream_retry_sec': 60,
+        'freeze_sec': 3.0,
+        'hot_standby': False,
+        'writer_threads': 2,
+        'writer_queue': 8,
+        'writer_policy': 'drop_oldest',
+        'adaptive_interval': False,
+        'video_mode': 'daily',
+        'segment_minutes': 30,
+        'keep_frames': True,
+        'ffmpeg_path': 'ffmpeg',
+        'encode_workers': 0,
+        'encode_prefetch_mb': 256,
+        'video_backend': 'opencv',
+        'video_codec': 'libx264',
+        'video_preset': 'veryfast',
+        'video_crf': 23,
+        'encode_processes': 1,
+        'checkpoint_frames': 1000,
+        'background_throttle': 1.0,
+        'encode_in_process': True,
+        'encode_priority': 'below_normal',
+        'encode_nice': 10,
+        'frame_ring_slots': 0,
+        'frame_ring_slot_mb': 0,
+        'frame_storage': 'files',
+        'min_jpeg_kb': 0,
+        **HEALTH_DEFAULTS,
+        **MOTION_DEFAULTS,
+        **QUALITY_DEFAULTS,
+        **RETENTION_DEFAULTS,
+        'log_view_lines': 2000
     }
 
-    def __init__(self, filename='config.yaml'):
+    def __init__(self, filename='config.yaml', readonly=False):
         self.filename = filename
+        self.readonly = readonly     # только чтение (утилиты): файл не переписывается, GUI не видит изменения
         self.yaml = YAML()
         self.yaml.preserve_quotes = False
         self.config = {}
@@ -471,27 +1750,36 @@ class ConfigManager:
             self.config['image_quality'] = max(75, min(100, int(q)))
 
             # Исправление времени, если нужно
-            begin_min = self._to_minutes(self.config['time_begin'])
-            end_min = self._to_minutes(self.config['time_end'])
-            if end_min <= begin_min:
-                self.config['time_end'] = self._from_minutes(begin_min + 60)
-            video_min = self._to_minutes(self.config['time_video'])
-            if video_min <= end_min:
-                self.config['time_video'] = self._from_minutes(end_min + 5)
+            self._fix_times(self.config)
+            for cam in self.config.get('cameras') or []:
+                self._fix_times(cam, self.config)
 
-            self._save()
+            if not self.readonly:
+                self._save()
         except Exception as e:
             logging.error(f"Ошибка загрузки config: {e}")
             self._save_default()
 
     def _save_default(self):
         self.config = self.DEFAULT_CONFIG.copy()
-        self._save()
+        if not self.readonly:
+            self._save()
 
     def _save(self):
         with open(self.filename, 'w', encoding='utf-8') as f:
             self.yaml.dump(self.config, f)
 
+    def _fix_times(self, cfg, base=None):
+        merged = {**(base or {}), **cfg}
+        begin_min = self._to_minutes(merged['time_begin'])
+        end_min = self._to_minutes(merged['time_end'])
+        if end_min <= begin_min:
+            end_min = begin_min + 60
+            cfg['time_end'] = self._from_minutes(end_min)
+        video_min = self._to_minutes(merged['time_video'])
+        if video_min <= end_min:
+            cfg['time_video'] = self._from_minutes(end_min + 5)
+
     def _to_minutes(self, t):
         h, m = map(int, str(t).split(':'))
         return h * 60 + m
@@ -512,6 +1800,48 @@ class ConfigManager:
 
     def __getitem__(self, key):
         return self.config[key]
+
+    def get_cameras(self):
+        """Имена камер; без списка cameras — одна камера из adress_url"""
+        cameras = self.config.get('cameras')
+        if not cameras:
+            return ['']
+        return [str(cam['name']) for cam in cameras]
+
+    def camera_config(self, name):
+        """Настройки камеры: общие ключи, перекрытые ключами из её записи в cameras"""
+        base = {k: v for k, v in self.config.items() if k != 'cameras'}
+        for cam in self.config.get('cameras') or []:
+            if str(cam['name']) == name:
+                return {**base, **cam}
+        return base
+
+
+class CameraConfig:
+    """Вид на ConfigManager для одной камеры — читает актуальный конфиг при каждом обращении"""
+    def __init__(self, config_manager, name):
+        self.config_manager = config_manager
+        self.name = name
+
+    @property
+    def config(self):
+        return self.config_manager.camera_config(self.name)
+
+    @property
+    def tag(self):
+        return f"[{self.name}] " if self.name else ""
+
+    @property
+    def capture_dir(self):
+        return os.path.join("capture", self.name) if self.name else "capture"
+
+    def get(self, key, default=None):
+        return self.config.get(key, default)
+
+    def __getitem__(self, key):
+        return self.config[key]
+
+
 class ConfigWatcher(FileSystemEventHandler):
     def __init__(self, config_manager, config_queue):
         self.config_manager = config_manager
@@ -1,5 +1,8 @@
+import os
 from os import path as os_path, rename as os_rename
 import logging
+import re
+import collections
 import sys
 from datetime import datetime, timedelta
 from logging.handlers import RotatingFileHandler
@@ -36,7 +39,7 @@ def create_new_handler():
         delay=True,
         encoding='utf-8'
     )
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
     return handler
 
 def replace_log_handler():
@@ -47,8 +50,11 @@ def replace_log_handler():
     root.addHandler(create_new_handler())
     root.setLevel(logging.INFO)
 
-replace_log_handler()
-logging.info("=== GUI ПРИЛОЖЕНИЕ ЗАПУЩЕНО ===")
+def setup_logging():
+    """Лог-файл открывает только GUI (main.py): процессы кодирования и утилиты командной строки
+    импортируют модуль, но в capture.log не пишут"""
+    replace_log_handler()
+    logging.info("=== GUI ПРИЛОЖЕНИЕ ЗАПУЩЕНО ===")
 
 def rotate_log_if_needed():
     current_log = get_current_log_path()
@@ -88,11 +94,97 @@ def rotate_log_if_needed():
                 logging.info(f"Удалён старый лог: {file.name}")
         except Exception as e:
             logging.warning(f"Ошибка при удалении старого лога {file.name}: {e}")
-            
-            
+
+
+# ----------------------------------------------------------------------
+# Хвост лога для окна «Лог»: читаются только новые байты.
+# Файл не держится открытым — иначе под Windows его не переименовать при ротации.
+# ----------------------------------------------------------------------
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+LOG_LINE_RE = re.compile(r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d+ - (' + '|'.join(LOG_LEVELS) + r') - ')
+
+
+class LogTail:
+    INITIAL_BYTES = 256 * 1024      # при первом чтении — только конец файла
+
+    def __init__(self, path, max_lines=2000):
+        self.path = path
+        self.lines = collections.deque(maxlen=max_lines)   # (уровень, строка)
+        self.file_id = None
+        self.offset = 0
+        self.partial = b""
+        self.level = 'INFO'
+
+    def _read(self, path, offset):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        return data, offset + len(data)
+
+    def _rotated_path(self, file_id):
+        """Куда переехал прочитанный файл: бэкап RotatingFileHandler или лог за вчера"""
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
+        for candidate in (self.path + ".1", get_dated_log_path(yesterday)):
+            try:
+                st = os.stat(candidate)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) == file_id:
+                return candidate
+        return None
+
+    def _split(self, data):
+        text = (self.partial + data).split(b"\n")
+        self.partial = text.pop()
+        new = []
+        for raw in text:
+            line = raw.decode('utf-8', errors='replace').rstrip('\r')
+            m = LOG_LINE_RE.match(line)
+            if m:
+                self.level = m.group(1)
+            # Строки без заголовка (трейсбеки, старый формат) — с уровнем предыдущей записи
+            new.append((self.level, line))
+        self.lines.extend(new)
+        return new
+
+    def poll(self):
+        """Новые строки [(уровень, строка)] с прошлого вызова"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        file_id = (st.st_dev, st.st_ino)
+        new = []
+        first = self.file_id is None
+        if first:
+            self.offset = max(0, st.st_size - self.INITIAL_BYTES)
+        elif file_id != self.file_id or st.st_size < self.offset:
+            # Ротация: дочитываем старый файл по новому имени, дальше — новый с начала
+            old = self._rotated_path(self.file_id) if file_id != self.file_id else None
+            if old is not None:
+                data, _ = self._read(old, self.offset)
+                new += self._split(data)
+            if self.partial:
+                new += self._split(b"\n")
+            self.offset = 0
+        self.file_id = file_id
+        if st.st_size > self.offset:
+            skip = first and self.offset > 0
+            data, self.offset = self._read(self.path, self.offset)
+            if skip:
+                # Начали с середины строки — её остаток отбрасываем
+                data = data[data.find(b"\n") + 1:]
+            new += self._split(data)
+        return new
+
+
 # ----------------------------------------------------------------------
 # Валидация конфигурации
 # ----------------------------------------------------------------------
+CAPTURE_MODES = ('element', 'screencast', 'cdp_jpeg', 'canvas', 'stream')
+VIDEO_BACKENDS = ('opencv', 'ffmpeg', 'image2')
+VIDEO_PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow')
+
 def validate_config(data):
     errors = []
     required = ['time_begin', 'time_end', 'time_period_interval', 'time_video', 'video_fps', 'delete_frames_after_video']
@@ -150,6 +242,128 @@ def validate_config(data):
 
     delete_frames = parse_bool(data['delete_frames_after_video'], 'delete_frames_after_video')
 
+    if 'max_browsers' in data:
+        try:
+            if int(data['max_browsers']) <= 0:
+                errors.append("max_browsers должен быть > 0")
+        except:
+            errors.append("max_browsers — целое число")
+
+    if 'window_size' in data and not re.fullmatch(r'\d+,\d+', str(data['window_size'])):
+        errors.append("window_size: ожидается ШИРИНА,ВЫСОТА, например 640,360")
+
+    if data.get('writer_policy', 'drop_oldest') not in ('drop_oldest', 'drop_newest'):
+        errors.append("writer_policy: drop_oldest или drop_newest")
+
+    if data.get('frame_storage', 'files') not in ('files', 'pack'):
+        errors.append("frame_storage: files или pack")
+
+    if data.get('video_mode', 'daily') not in ('daily', 'streaming'):
+        errors.append("video_mode: daily или streaming")
+    if 'segment_minutes' in data:
+        try:
+            if float(data['segment_minutes']) <= 0:
+                errors.append("segment_minutes должен быть > 0")
+        except:
+            errors.append("segment_minutes — положительное число")
+    if data.get('video_backend', 'opencv') not in VIDEO_BACKENDS:
+        errors.append(f"video_backend: допустимо {', '.join(VIDEO_BACKENDS)}")
+    if data.get('video_codec', 'libx264') not in ('libx264', 'libx265'):
+        errors.append("video_codec: libx264 или libx265")
+    if data.get('video_preset', 'veryfast') not in VIDEO_PRESETS:
+        errors.append(f"video_preset: допустимо {', '.join(VIDEO_PRESETS)}")
+    try:
+        if not 0 <= int(data.get('video_crf', 23)) <= 51:
+            errors.append("video_crf — от 0 до 51")
+    except:
+        errors.append("video_crf — целое число от 0 до 51")
+
+    parse_bool(data.get('encode_in_process', True), 'encode_in_process')
+    if data.get('encode_priority', 'below_normal') not in ('idle', 'below_normal', 'normal'):
+        errors.append("encode_priority: idle, below_normal или normal")
+    try:
+        if not 0 <= int(data.get('encode_nice', 10)) <= 19:
+            errors.append("encode_nice — от 0 до 19")
+    except:
+        errors.append("encode_nice — целое число от 0 до 19")
+
+    if 'checkpoint_frames' in data:
+        try:
+            if int(data['checkpoint_frames']) < 100:
+                errors.append("checkpoint_frames должен быть не меньше 100")
+        except:
+            errors.append("checkpoint_frames — целое число")
+
+    for key in ('encode_workers', 'encode_prefetch_mb', 'encode_processes', 'background_throttle',
+                'frame_ring_slots', 'frame_ring_slot_mb', 'min_jpeg_kb', 'health_width', 'health_black_level',
+                'health_black_fraction', 'health_uniform_std', 'health_blur_min', 'health_freeze_hamming',
+                'health_freeze_mad', 'health_freeze_frames', 'motion_pixel_level', 'motion_skip_fraction',
+                'motion_burst_fraction', 'motion_burst_interval', 'motion_burst_sec', 'motion_keepalive_sec',
+                'jpeg_budget_kb', 'jpeg_budget_gb_day', 'retention_max_gb', 'retention_frame_days',
+                'retention_video_days', 'retention_min_free_gb', 'retention_check_min', 'retention_batch',
+                'retention_pause_ms', 'log_view_lines'):
+        if key in data:
+            try:
+                if float(data[key]) < 0:
+                    raise ValueError
+            except:
+                errors.append(f"{key} — неотрицательное число (0 — по умолчанию)")
+    try:
+        q_min, q_max = int(data.get('jpeg_quality_min', 50)), int(data.get('jpeg_quality_max', 95))
+        if not 1 <= q_min <= q_max <= 100:
+            errors.append("jpeg_quality_min/jpeg_quality_max — от 1 до 100, min не больше max")
+    except:
+        errors.append("jpeg_quality_min/jpeg_quality_max — целые числа")
+    parse_bool(data.get('jpeg_fast_encode', True), 'jpeg_fast_encode')
+    parse_bool(data.get('motion_mode', False), 'motion_mode')
+    try:
+        if float(data.get('motion_skip_fraction', 0.002)) > float(data.get('motion_burst_fraction', 0.02)):
+            errors.append("motion_skip_fraction не может быть больше motion_burst_fraction")
+    except:
+        pass
+    keep_frames = parse_bool(data.get('keep_frames', True), 'keep_frames')
+    if keep_frames is False and data.get('video_mode', 'daily') != 'streaming':
+        # Без JPEG и без сегментов кадры дня просто терялись бы
+        errors.append("keep_frames: false допустимо только при video_mode: streaming")
+
+    modes = [data.get('capture_mode', 'element')] + [c.get('capture_mode') for c in data.get('cameras') or [] if isinstance(c, dict)]
+    for mode in modes:
+        if mode is not None and mode not in CAPTURE_MODES:
+            errors.append(f"capture_mode: {mode} — допустимо {', '.join(CAPTURE_MODES)}")
+
+    cameras = data.get('cameras')
+    if cameras is not None:
+        if not isinstance(cameras, list) or not cameras:
+            errors.append("cameras — непустой список камер")
+        else:
+            names = set()
+            for i, cam in enumerate(cameras, 1):
+                if not isinstance(cam, dict):
+                    errors.append(f"cameras[{i}]: ожидается словарь с name и adress_url")
+                    continue
+                name = str(cam.get('name', ''))
+                if not re.fullmatch(r'[\w\-. ]+', name):
+                    errors.append(f"cameras[{i}]: имя камеры задаёт папку — буквы, цифры, '-', '_', '.'")
+                elif name in names:
+                    errors.append(f"cameras[{i}]: повтор имени {name}")
+                names.add(name)
+                if not cam.get('adress_url'):
+                    errors.append(f"cameras[{i}]: отсутствует adress_url")
+                cam_begin = parse_time(cam.get('time_begin', data['time_begin']), f"cameras[{i}].time_begin")
+                cam_end = parse_time(cam.get('time_end', data['time_end']), f"cameras[{i}].time_end")
+                cam_video = parse_time(cam.get('time_video', data['time_video']), f"cameras[{i}].time_video")
+                if None not in (cam_begin, cam_end, cam_video):
+                    if cam_end <= cam_begin:
+                        errors.append(f"cameras[{i}]: time_end должен быть позже time_begin")
+                    if cam_video <= cam_end:
+                        errors.append(f"cameras[{i}]: time_video должен быть позже time_end")
+                if 'time_period_interval' in cam:
+                    try:
+                        if float(cam['time_period_interval']) <= 0:
+                            raise ValueError
+                    except:
+                        errors.append(f"cameras[{i}]: time_period_interval должен быть > 0")
+
     parsed = {
         'interval': interval,     # теперь float
         'fps': fps,
@@ -171,23 +385,16 @@ def resource_path(relative_path):
     return os_path.join(base_path, relative_path)    
 
 
-def cleanup_processes():
-    for proc in psutil.process_iter(['pid', 'name']):
+def kill_process_tree(pid):
+    """Убивает процесс и всех его потомков (chromedriver → chrome)"""
+    try:
+        parent = psutil.Process(pid)
+    except psutil.NoSuchProcess:
+        return
+    for proc in parent.children(recursive=True) + [parent]:
         try:
-            if proc.info['name'].lower() in ['chromedriver.exe', 'chrome.exe']:
-                proc.kill()
-                logging.info(f"Убит: {proc.info['name']} (PID: {proc.info['pid']})")
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
         except Exception as e:
-            logging.warning(f"Не удалось убить процесс: {e}")
-            
-            
-def is_image_black(img):
-    try:
-        w, h = img.size
-        for x in range(0, w, 10):
-            for y in range(0, h, 10):
-                if img.getpixel((x, y))[:3] != (0, 0, 0):
-                    return False
-        return True
-    except:
-        return False            
\ No newline at end of file
+            logging.warning(f"Не удалось убить процесс {proc.pid}: {e}")
@@ -0,0 +1,196 @@
+import time
+import threading
+from datetime import date
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+# ----------------------------------------------------------------------
+# Проверка кадра: все проверки на одном уменьшенном NumPy-представлении.
+# Пороги — из конфига (ключи health_*), время каждой проверки копится в stats().
+# ----------------------------------------------------------------------
+HEALTH_DEFAULTS = {
+    'health_width': 320,             # ширина уменьшенного кадра для проверок
+    'health_black_level': 16,        # яркость, ниже которой пиксель считается чёрным
+    'health_black_fraction': 0.98,   # доля чёрных пикселей для «чёрного кадра»
+    'health_uniform_std': 3.0,       # СКО яркости ниже — однотонный экран «нет сигнала»
+    'health_blur_min': 0.0,          # дисперсия лапласиана ниже — размытый кадр; 0 — не проверять
+    'health_freeze_hamming': 2,      # расстояние pHash, при котором кадры считаются одинаковыми
+    'health_freeze_mad': 0.5,        # и среднее отличие яркости меньше этого (живое видео всегда шумит)
+    'health_freeze_frames': 5,       # столько одинаковых кадров подряд — картинка зависла
+}
+CHECKS = ('prepare', 'black', 'uniform', 'blur', 'freeze')
+
+
+def phash(gray):
+    """Перцептивный хеш: DCT 32x32 → младшие 8x8 частот против медианы → 64 бита"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small)[:8, :8].ravel()
+    return np.packbits(low > np.median(low[1:]))
+
+
+def hamming(a, b):
+    return int(np.unpackbits(np.bitwise_xor(a, b)).sum())
+
+
+class FrameHealth:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()      # состояние зависания общее для воркеров записи
+        self.prev_hash = None
+        self.prev_gray = None
+        self.same = 0
+        self.same_since = 0.0
+        self.timings = {name: 0.0 for name in CHECKS}
+        self.calls = 0
+
+    def _get(self, key):
+        return type(HEALTH_DEFAULTS[key])(self.config.get(key, HEALTH_DEFAULTS[key]))
+
+    def check(self, img, freeze=True):
+        """img — PIL-кадр. Возвращает (причина отказа или None, отчёт: метрики, хеш и время проверок).
+        freeze=False — зависание уже отслеживается по currentTime видео, по картинке его не ищем"""
+        t = time.perf_counter()
+        timings = {}
+        metrics = {}
+
+        def lap(name):
+            nonlocal t
+            now = time.perf_counter()
+            timings[name] = now - t
+            t = now
+
+        width = self._get('health_width')
+        w, h = img.size
+        if w > width:
+            img = img.resize((width, max(1, round(h * width / w))), Image.BOX)
+        rgb = np.asarray(img, dtype=np.float32)
+        gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32) if rgb.ndim == 3 else rgb
+        lap('prepare')
+
+        reason = None
+        black = float((gray < self._get('health_black_level')).mean())
+        metrics['black'] = black
+        if black >= self._get('health_black_fraction'):
+            reason = "Чёрный кадр"
+        lap('black')
+
+        std = float(gray.std())
+        metrics['std'] = std
+        if reason is None and std < self._get('health_uniform_std'):
+            reason = f"Однотонный кадр (нет сигнала), СКО {std:.1f}"
+        lap('uniform')
+
+        blur_min = self._get('health_blur_min')
+        laplacian = (4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1] - gray[1:-1, :-2] - gray[1:-1, 2:])
+        sharpness = float(laplacian.var())
+        metrics['sharpness'] = sharpness
+        if reason is None and blur_min > 0 and sharpness < blur_min:
+            reason = f"Размытый кадр, резкость {sharpness:.1f}"
+        lap('blur')
+
+        digest = phash(gray)
+        with self.lock:
+            if reason is None and freeze:
+                frozen = False
+                if self.prev_hash is not None and self.prev_gray is not None and self.prev_gray.shape == gray.shape:
+                    distance = hamming(digest, self.prev_hash)
+                    mad = float(np.abs(gray - self.prev_gray).mean())
+                    metrics['hamming'] = distance
+                    metrics['mad'] = mad
+                    frozen = distance <= self._get('health_freeze_hamming') and mad < self._get('health_freeze_mad')
+                if not frozen:
+                    self.same, self.same_since = 0, time.monotonic()
+                else:
+                    self.same += 1
+                self.prev_hash, self.prev_gray = digest, gray
+                # Живая, но неподвижная сцена тоже даёт одинаковые кадры — нужен и счёт, и время
+                still = time.monotonic() - self.same_since
+                if self.same >= self._get('health_freeze_frames') and still >= float(self.config.get('freeze_sec', 3.0)):
+                    reason = f"Картинка не меняется {still:.0f} с ({self.same + 1} кадров подряд)"
+                    self.same = 0
+            elif not freeze:
+                self.same = 0
+            lap('freeze')
+            for name, spent in timings.items():
+                self.timings[name] += spent
+            self.calls += 1
+        return reason, {'metrics': metrics, 'hash': digest.tobytes().hex(), 'timings': timings, 'gray': gray}
+
+    def stats(self):
+        """Среднее время каждой проверки, мс"""
+        with self.lock:
+            calls = max(1, self.calls)
+            return {name: self.timings[name] * 1000 / calls for name in CHECKS}, self.calls
+
+
+# ----------------------------------------------------------------------
+# Движение: доля изменившихся пикселей против последнего сохранённого кадра.
+# Тихие кадры не пишутся (только считаются), при движении интервал сокращается.
+# ----------------------------------------------------------------------
+MOTION_DEFAULTS = {
+    'motion_mode': False,            # адаптивный захват по движению
+    'motion_pixel_level': 12,        # на сколько должна измениться яркость пикселя, чтобы он считался изменившимся
+    'motion_skip_fraction': 0.002,   # изменилось меньше этой доли пикселей — кадр не сохраняем
+    'motion_burst_fraction': 0.02,   # больше — движение: интервал сокращается
+    'motion_burst_interval': 0.2,    # интервал захвата при движении, с
+    'motion_burst_sec': 10.0,        # сколько держать короткий интервал после последнего движения
+    'motion_keepalive_sec': 60.0,    # без движения всё равно сохранять кадр раз в столько секунд
+}
+
+
+class MotionDetector:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.ref_gray = None             # уменьшенный последний сохранённый кадр
+        self.ref_time = 0.0
+        self.burst_until = 0.0
+        self.day = None
+        self.stored = 0
+        self.skipped = 0
+        self.bursts = 0
+
+    def _get(self, key):
+        return type(MOTION_DEFAULTS[key])(self.config.get(key, MOTION_DEFAULTS[key]))
+
+    @property
+    def enabled(self):
+        return bool(self.config.get('motion_mode', False))
+
+    def update(self, gray):
+        """gray — уменьшенный кадр из FrameHealth. Возвращает (сохранять ли кадр, доля изменившихся пикселей)"""
+        now = time.monotonic()
+        with self.lock:
+            today = date.today()
+            if self.day != today:
+                self.day, self.stored, self.skipped = today, 0, 0
+            comparable = self.ref_gray is not None and self.ref_gray.shape == gray.shape
+            if comparable:
+                changed = float((np.abs(gray - self.ref_gray) > self._get('motion_pixel_level')).mean())
+            else:
+                changed = 1.0    # первый кадр или сменился размер — сравнивать не с чем, сохраняем
+
+            if comparable and changed >= self._get('motion_burst_fraction'):
+                if now >= self.burst_until:
+                    self.bursts += 1
+                self.burst_until = now + self._get('motion_burst_sec')
+
+            keep = (changed >= self._get('motion_skip_fraction')
+                    or now - self.ref_time >= self._get('motion_keepalive_sec'))
+            if keep:
+                self.ref_gray, self.ref_time = gray, now
+                self.stored += 1
+            else:
+                self.skipped += 1
+            return keep, changed
+
+    def bursting(self):
+        return self.enabled and time.monotonic() < self.burst_until
+
+    def stats(self):
+        """Сохранено и пропущено кадров за сегодня, всплесков движения с запуска"""
+        with self.lock:
+            return self.stored, self.skipped, self.bursts
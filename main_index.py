@@ -0,0 +1,148 @@
+import os
+import bisect
+import logging
+import threading
+import collections
+from datetime import datetime
+
+from main_pack import frame_time, pack_entries
+
+
+# ----------------------------------------------------------------------
+# Индекс кадров дня: счётчик в памяти + дописываемый манифест на диске.
+# Строка манифеста: время<TAB>имя<TAB>размер<TAB>хеш качества (pHash из FrameHealth).
+# Каталог дня сканируется только если манифеста нет.
+# ----------------------------------------------------------------------
+INDEX_FILE = "frames-index.tsv"
+
+
+class FrameIndex:
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_FILE)
+        self.lock = threading.Lock()
+        self.times = []       # отсортированы; кадры воркеров приходят почти по порядку
+        self.names = []
+        self.known = set()    # имена в индексе: кадр, уже найденный при восстановлении, не добавится второй раз
+        self.total_bytes = 0
+        self._load()
+
+    def _load(self):
+        self.times, self.names, self.known, self.total_bytes = [], [], set(), 0
+        if not os.path.exists(self.path):
+            self._rebuild()
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) != 4:
+                    continue   # оборванная строка после сбоя
+                try:
+                    self._insert(float(parts[0]), parts[1], int(parts[2]))
+                except ValueError:
+                    continue
+
+    def _rebuild(self):
+        """Манифеста нет (старый день или удалён) — один проход по каталогу"""
+        if not os.path.isdir(self.folder):
+            return
+        lines = []
+        for entry in os.scandir(self.folder):
+            if entry.name.startswith("capt-") and entry.name.endswith(".jpg"):
+                try:
+                    ts = frame_time(entry.name)
+                except ValueError:
+                    continue
+                size = entry.stat().st_size
+                if self._insert(ts, entry.name, size):
+                    lines.append(f"{ts:.3f}\t{entry.name}\t{size}\t-\n")
+        for e in pack_entries(self.folder):
+            if self._insert(e.timestamp, e.name, e.size):
+                lines.append(f"{e.timestamp:.3f}\t{e.name}\t{e.size}\t-\n")
+        lines.sort()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        if lines:
+            logging.info(f"Индекс кадров {self.folder} восстановлен: {len(lines)} кадров")
+
+    def _insert(self, ts, name, size):
+        """False — кадр уже в индексе"""
+        if name in self.known:
+            return False
+        self.known.add(name)
+        if not self.times or ts >= self.times[-1]:
+            self.times.append(ts)
+            self.names.append(name)
+        else:
+            i = bisect.bisect_right(self.times, ts)
+            self.times.insert(i, ts)
+            self.names.insert(i, name)
+        self.total_bytes += size
+        return True
+
+    def _check(self):
+        # Манифест удаляется вместе с кадрами (после видео) — тогда индекс перечитывается
+        if not os.path.exists(self.path):
+            self._load()
+
+    def add(self, name, size, qhash='-', ts=None):
+        ts = frame_time(name) if ts is None else ts
+        with self.lock:
+            self._check()
+            if not self._insert(ts, name, size):
+                # Первый кадр дня: индекс создан уже после записи файла и нашёл его при восстановлении
+                return
+            # Файл открывается на одну запись: под Windows открытый манифест нельзя было бы удалить
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{ts:.3f}\t{name}\t{size}\t{qhash}\n")
+
+    def count(self):
+        with self.lock:
+            self._check()
+            return len(self.times)
+
+    def last(self):
+        with self.lock:
+            self._check()
+            return self.names[-1] if self.names else None
+
+    def range(self, start_ts, end_ts):
+        """Имена кадров с start_ts <= время < end_ts, по порядку — бинарный поиск"""
+        with self.lock:
+            self._check()
+            lo = bisect.bisect_left(self.times, start_ts)
+            hi = bisect.bisect_left(self.times, end_ts)
+            return self.names[lo:hi]
+
+
+# Сегодняшние индексы держатся всегда, прошлых дней — не больше MAX_PAST_INDEXES (нужны очереди кодирования и клипам)
+MAX_PAST_INDEXES = 4
+_INDEXES = collections.OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def day_index(folder):
+    """Общий на процесс индекс дня; None — каталога дня ещё нет"""
+    folder = os.path.normpath(folder)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(folder)
+        if index is None:
+            if not os.path.isdir(folder):
+                return None
+            index = _INDEXES[folder] = FrameIndex(folder)
+        _INDEXES.move_to_end(folder)
+        today = datetime.now().strftime("%Y%m%d")
+        past = [key for key in _INDEXES if os.path.basename(key) != today]
+        for key in past[:max(0, len(past) - MAX_PAST_INDEXES)]:
+            del _INDEXES[key]
+        return index
+
+
+def drop_index(folder):
+    """Кадры дня удалены: манифест — последним, чтобы индекс не восстановился из полупустого каталога"""
+    with _INDEXES_LOCK:
+        _INDEXES.pop(os.path.normpath(folder), None)
+    try:
+        os.remove(os.path.join(folder, INDEX_FILE))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,235 @@
+import os
+import sys
+import mmap
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+
+# ----------------------------------------------------------------------
+# Пакет кадров дня: JPEG дописываются подряд в один файл frames-<дата>.pack,
+# рядом — индекс frames-<дата>.idx из записей фиксированной длины.
+# Сначала пишутся данные, потом запись индекса: после сбоя индекс никогда
+# не указывает за конец данных, недописанный хвост просто не попадает в индекс.
+# ----------------------------------------------------------------------
+INDEX_DTYPE = np.dtype([
+    ('timestamp', '<f8'),     # время кадра, секунды epoch (из имени capt-...)
+    ('offset', '<u8'),
+    ('size', '<u4'),
+    ('reserved', '<u4'),
+])
+
+
+def pack_paths(folder):
+    date_str = os.path.basename(os.path.normpath(folder))
+    base = os.path.join(folder, f"frames-{date_str}")
+    return base + ".pack", base + ".idx"
+
+
+def frame_time(name):
+    """capt-YYYYMMDD_HH-MM-SS-mmm[_N].jpg → секунды epoch"""
+    return datetime.strptime(os.path.basename(name)[5:26], "%Y%m%d_%H-%M-%S-%f").timestamp()
+
+
+def frame_name(timestamp):
+    dt = datetime.fromtimestamp(timestamp)
+    return f"capt-{dt.strftime('%Y%m%d_%H-%M-%S')}-{dt.microsecond // 1000:03d}.jpg"
+
+
+def pack_frame_count(folder):
+    """Число кадров в пакете — по размеру индекса, без чтения"""
+    _, idx_path = pack_paths(folder)
+    try:
+        return os.path.getsize(idx_path) // INDEX_DTYPE.itemsize
+    except OSError:
+        return 0
+
+
+def delete_pack(folder):
+    """Удаление кадров дня из пакета — два unlink вместо десятков тысяч"""
+    count = pack_frame_count(folder)
+    for path in pack_paths(folder):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return count
+
+
+class PackWriter:
+    def __init__(self, folder):
+        self.folder = folder
+        self.pack_path, self.idx_path = pack_paths(folder)
+        self.lock = threading.Lock()      # воркеры записи дописывают по очереди
+        os.makedirs(folder, exist_ok=True)
+        # Оборванная запись индекса после сбоя отрезается
+        if os.path.exists(self.idx_path):
+            size = os.path.getsize(self.idx_path)
+            whole = size - size % INDEX_DTYPE.itemsize
+            if whole != size:
+                with open(self.idx_path, 'r+b') as f:
+                    f.truncate(whole)
+        self.pack = open(self.pack_path, 'ab')
+        self.idx = open(self.idx_path, 'ab')
+        self.last = None      # (время, смещение, размер) последнего кадра — для превью без чтения индекса
+
+    def append(self, data, timestamp):
+        record = np.zeros((), INDEX_DTYPE)
+        with self.lock:
+            offset = self.pack.seek(0, os.SEEK_END)
+            self.pack.write(data)
+            self.pack.flush()
+            record['timestamp'] = timestamp
+            record['offset'] = offset
+            record['size'] = len(data)
+            self.idx.write(record.tobytes())
+            self.idx.flush()
+            self.last = (timestamp, offset, len(data))
+
+    def close(self):
+        with self.lock:
+            self.pack.close()
+            self.idx.close()
+
+
+class PackEntry:
+    """Один кадр пакета; передаётся в процессы кодирования вместо пути к файлу"""
+    __slots__ = ('pack_path', 'offset', 'size', 'timestamp', 'name')
+
+    def __init__(self, pack_path, offset, size, timestamp, name):
+        self.pack_path = pack_path
+        self.offset = offset
+        self.size = size
+        self.timestamp = timestamp
+        self.name = name
+
+    def __getstate__(self):
+        return (self.pack_path, self.offset, self.size, self.timestamp, self.name)
+
+    def __setstate__(self, state):
+        self.pack_path, self.offset, self.size, self.timestamp, self.name = state
+
+    def read(self):
+        return _mapped(self.pack_path, self.offset + self.size)[self.offset:self.offset + self.size]
+
+
+_MAPS = {}
+_MAPS_LOCK = threading.Lock()
+
+
+def _mapped(path, need):
+    """mmap пакета на процесс; пакет растёт — при нехватке длины отображение пересоздаётся"""
+    with _MAPS_LOCK:
+        mapped = _MAPS.get(path)
+        if mapped is None or len(mapped) < need:
+            if mapped is not None:
+                mapped.close()
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            _MAPS[path] = mapped
+        return mapped
+
+
+def release_pack(folder):
+    """Закрыть отображение пакета (под Windows иначе его не удалить)"""
+    pack_path, _ = pack_paths(folder)
+    with _MAPS_LOCK:
+        mapped = _MAPS.pop(pack_path, None)
+    if mapped is not None:
+        mapped.close()
+
+
+def read_index(folder):
+    _, idx_path = pack_paths(folder)
+    if not os.path.exists(idx_path):
+        return np.zeros(0, INDEX_DTYPE)
+    with open(idx_path, 'rb') as f:
+        raw = f.read()
+    return np.frombuffer(raw[:len(raw) - len(raw) % INDEX_DTYPE.itemsize], INDEX_DTYPE)
+
+
+def pack_entries(folder, start_ts=None, end_ts=None):
+    """Кадры пакета по времени; с границами — только start_ts <= время < end_ts (бинарный поиск)"""
+    index = read_index(folder)
+    if not len(index):
+        return []
+    pack_path, _ = pack_paths(folder)
+    index = index[np.argsort(index['timestamp'], kind='stable')]
+    if start_ts is not None:
+        lo, hi = np.searchsorted(index['timestamp'], [start_ts, end_ts], side='left')
+        index = index[lo:hi]
+    return [PackEntry(pack_path, int(r['offset']), int(r['size']), float(r['timestamp']), frame_name(r['timestamp']))
+            for r in index]
+
+
+def load_frame(file_path, writer=None):
+    """JPEG кадра по «виртуальному» пути capt-... из пакета его дня; None — нет такого.
+    writer — PackWriter этого дня: последний записанный кадр берётся без чтения индекса"""
+    folder, name = os.path.split(file_path)
+    ts = frame_time(name)
+    last = writer.last if writer is not None and os.path.normpath(writer.folder) == os.path.normpath(folder) else None
+    if last is not None and abs(last[0] - ts) < 0.0005:
+        offset, size = last[1], last[2]
+    else:
+        index = read_index(folder)
+        if not len(index):
+            return None
+        hits = np.nonzero(np.abs(index['timestamp'] - ts) < 0.0005)[0]
+        if not len(hits):
+            return None
+        offset, size = int(index[hits[-1]]['offset']), int(index[hits[-1]]['size'])
+    pack_path, _ = pack_paths(folder)
+    # Без mmap: отображение из GUI мешало бы удалить пакет под Windows
+    with open(pack_path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def export_pack(folder, out_dir=None):
+    """Обратно в отдельные JPEG (capt-...jpg) — для просмотра и старых инструментов"""
+    out_dir = out_dir or folder
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    used = set()
+    for entry in pack_entries(folder):
+        name = entry.name
+        while name in used:
+            name = f"{name[:-4]}_1.jpg"
+        used.add(name)
+        with open(os.path.join(out_dir, name), 'wb') as f:
+            f.write(entry.read())
+        count += 1
+    release_pack(folder)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакеты кадров дня (frame_storage: pack)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_export = sub.add_parser('export', help="выгрузить кадры пакета в отдельные JPEG")
+    p_export.add_argument('folder', help="папка дня, например capture/20250101")
+    p_export.add_argument('out_dir', nargs='?', help="куда выгрузить (по умолчанию — в папку дня)")
+    p_info = sub.add_parser('info', help="число кадров и интервал времени")
+    p_info.add_argument('folder')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        count = export_pack(args.folder, args.out_dir)
+        print(f"Выгружено кадров: {count}")
+    else:
+        index = read_index(args.folder)
+        if not len(index):
+            print("Пакет пуст или отсутствует")
+            return 1
+        ts = np.sort(index['timestamp'])
+        print(f"Кадров: {len(index)}, {frame_name(ts[0])} … {frame_name(ts[-1])}, "
+              f"{int(index['size'].sum()) / 1024 / 1024:.1f} МБ")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import io
+import time
+import threading
+import collections
+from datetime import date
+
+
+# ----------------------------------------------------------------------
+# Качество JPEG под бюджет размера: обратная связь по среднему размеру
+# последних кадров. Без бюджета — прежнее фиксированное image_quality.
+# ----------------------------------------------------------------------
+QUALITY_DEFAULTS = {
+    'jpeg_budget_kb': 0,             # цель — КБ на кадр; 0 — не задана
+    'jpeg_budget_gb_day': 0.0,       # или ГБ в день на камеру (пересчёт в КБ на кадр по расписанию и интервалу)
+    'jpeg_quality_min': 50,          # пределы качества, в которых ходит регулятор
+    'jpeg_quality_max': 95,
+    'jpeg_fast_encode': True,        # без optimize/progressive, когда бюджет позволяет и на максимальном качестве
+}
+
+
+class QualityController:
+    EMA = 0.1               # сглаживание среднего размера кадра
+    STEP_FRAMES = 10        # качество меняется не чаще раза в столько кадров
+    PROBE_FRAMES = 200      # раз в столько кадров кадр кодируется обоими способами — замер размера и времени
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.quality = None
+        self.fast = False
+        self.avg_bytes = None            # средний размер в пересчёте на optimize+progressive
+        self.ratio = None                # размер быстрого JPEG / размер оптимизированного
+        self.encode_ms = {False: None, True: None}
+        self.frames = 0
+        self.since_step = 0
+        self.day = None
+        self.hist = collections.Counter()
+        self.fast_frames = 0
+
+    def _int(self, key):
+        return int(self.config.get(key, QUALITY_DEFAULTS[key]))
+
+    def _minutes(self, key, default):
+        h, m = map(int, str(self.config.get(key, default)).split(':'))
+        return h * 60 + m
+
+    def _frames_per_day(self):
+        begin = self._minutes('time_begin', '06:00')
+        end = self._minutes('time_end', '19:00')
+        interval = max(0.01, float(self.config.get('time_period_interval', 0.5)))
+        return max(1.0, max(1, end - begin) * 60 / interval)
+
+    def target_bytes(self):
+        """Цель в байтах на кадр; None — бюджета нет"""
+        kb = float(self.config.get('jpeg_budget_kb', 0))
+        if kb > 0:
+            return kb * 1024
+        gb = float(self.config.get('jpeg_budget_gb_day', 0))
+        if gb > 0:
+            # Кадры, пропущенные режимом движения, бюджет не тратят — получается с запасом
+            return gb * 1024 ** 3 / self._frames_per_day()
+        return None
+
+    def current(self):
+        """Качество для следующего кадра (и для JPEG, который кодирует сам Chrome)"""
+        if self.target_bytes() is None:
+            return max(75, min(100, int(self.config.get('image_quality', 92))))
+        lo, hi = self._int('jpeg_quality_min'), self._int('jpeg_quality_max')
+        with self.lock:
+            if self.quality is None:
+                self.quality = int(self.config.get('image_quality', 92))
+            self.quality = max(lo, min(hi, self.quality))
+            return self.quality
+
+    def _save(self, img, quality, fast):
+        t = time.perf_counter()
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=quality, optimize=not fast, progressive=not fast)
+        return buf.getvalue(), (time.perf_counter() - t) * 1000
+
+    def encode(self, img):
+        """PIL-кадр → JPEG с текущим качеством и способом кодирования"""
+        quality = self.current()
+        budget = self.target_bytes() is not None
+        fast = budget and self.fast
+        data, spent = self._save(img, quality, fast)
+        if budget and self.config.get('jpeg_fast_encode', True) and self.frames % self.PROBE_FRAMES == 0:
+            # Замер: тот же кадр другим способом — во сколько обходится optimize по байтам и по времени
+            other, other_spent = self._save(img, quality, not fast)
+            fast_size, opt_size = (len(data), len(other)) if fast else (len(other), len(data))
+            with self.lock:
+                self.ratio = fast_size / max(1, opt_size)
+                self._time(not fast, other_spent)
+        with self.lock:
+            self._time(fast, spent)
+        self.observe(len(data), quality, fast)
+        return data
+
+    def _time(self, fast, spent):
+        prev = self.encode_ms[fast]
+        self.encode_ms[fast] = spent if prev is None else prev + self.EMA * (spent - prev)
+
+    def observe(self, size, quality=None, fast=False):
+        """Размер записанного кадра — в том числе готового JPEG из Chrome"""
+        quality = self.current() if quality is None else quality
+        target = self.target_bytes()
+        with self.lock:
+            today = date.today()
+            if self.day != today:
+                self.day = today
+                self.hist.clear()
+                self.fast_frames = 0
+            self.frames += 1
+            self.hist[quality] += 1
+            self.fast_frames += fast
+            if target is None:
+                return
+
+            opt_size = size / self.ratio if fast and self.ratio else size
+            self.avg_bytes = opt_size if self.avg_bytes is None else self.avg_bytes + self.EMA * (opt_size - self.avg_bytes)
+            self.since_step += 1
+            if self.since_step < self.STEP_FRAMES:
+                return
+            self.since_step = 0
+
+            hi = self._int('jpeg_quality_max')
+            expected = self.avg_bytes * (self.ratio if self.fast and self.ratio else 1)
+            ratio = expected / target
+            if ratio > 1.05:
+                if self.fast:
+                    self.fast = False
+                else:
+                    self.quality = max(self._int('jpeg_quality_min'), self.quality - max(1, round((ratio - 1) * 20)))
+            elif ratio < 0.9 and self.quality < hi:
+                self.quality += 1
+            elif (self.quality >= hi and not self.fast and self.ratio and self.config.get('jpeg_fast_encode', True)
+                  and self.avg_bytes * self.ratio < 0.95 * target):
+                # Запас есть даже на максимальном качестве — тратим его на экономию CPU
+                self.fast = True
+
+    def stats(self):
+        """Распределение качества за сегодня, доля быстрых кадров, средний размер и цель (КБ), время кодирования (мс)"""
+        target = self.target_bytes()
+        with self.lock:
+            frames = sum(self.hist.values())
+            return {
+                'hist': dict(sorted(self.hist.items())),
+                'frames': frames,
+                'fast_share': self.fast_frames / frames if frames else 0.0,
+                'avg_kb': (self.avg_bytes or 0) / 1024,
+                'target_kb': target / 1024 if target else None,
+                'encode_ms': dict(self.encode_ms),
+            }
@@ -0,0 +1,193 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from main_pack import delete_pack, release_pack
+from main_index import drop_index
+
+
+# ----------------------------------------------------------------------
+# Хранение: фоновая очистка capture/ по возрасту, общему размеру и свободному месту.
+# Удаление идёт пачками с паузами, в своём потоке — захват диск не ждёт.
+# Кадры удаляются только у дней, для которых уже есть видео.
+# ----------------------------------------------------------------------
+RETENTION_DEFAULTS = {
+    'retention_max_gb': 0.0,         # предел размера всех дней всех камер; 0 — без предела
+    'retention_frame_days': 0,       # кадры дней с готовым видео старше стольких дней удаляются; 0 — не удалять
+    'retention_video_days': 0,       # видео старше стольких дней удаляются; 0 — хранить всегда
+    'retention_min_free_gb': 0.0,    # держать на диске свободными не меньше стольких ГБ; 0 — не следить
+    'retention_check_min': 10,       # период проверки, мин
+    'retention_batch': 200,          # файлов в пачке удаления
+    'retention_pause_ms': 50,        # пауза между пачками
+}
+
+
+def _is_frame(name):
+    return name.startswith("capt-") and name.endswith(".jpg")
+
+
+def remove_files(paths, batch=200, pause=0.05):
+    """Удаление списка файлов пачками: после каждой пачки поток уступает диск захвату"""
+    deleted = 0
+    for i, path in enumerate(paths, 1):
+        try:
+            os.remove(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Не удалось удалить {path}: {e}")
+        if pause > 0 and i % batch == 0:
+            time.sleep(pause)
+    return deleted
+
+
+def purge_frames(folder, batch=200, pause=0.05):
+    """Все кадры дня: JPEG по os.scandir, пакет, сегменты; индекс — последним"""
+    with os.scandir(folder) as it:
+        paths = [entry.path for entry in it if _is_frame(entry.name)]
+    deleted = remove_files(paths, batch, pause)
+    release_pack(folder)
+    deleted += delete_pack(folder)
+    shutil.rmtree(os.path.join(folder, "segments"), ignore_errors=True)
+    drop_index(folder)
+    return deleted
+
+
+def folder_size(folder):
+    total = 0
+    stack = [folder]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    return total
+
+
+class RetentionManager:
+    def __init__(self, config_manager, cameras):
+        """cameras — {имя: (CameraConfig, очередь сообщений GUI камеры)}"""
+        self.config_manager = config_manager
+        self.cameras = cameras
+        self.wakeup = threading.Event()
+
+    def _get(self, key):
+        return type(RETENTION_DEFAULTS[key])(self.config_manager.get(key, RETENTION_DEFAULTS[key]))
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="retention").start()
+
+    def check_now(self):
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Ошибка очистки хранилища: {e}")
+            self.wakeup.wait(max(1, self._get('retention_check_min')) * 60)
+            self.wakeup.clear()
+
+    def _days(self):
+        """(дата, камера, папка дня, путь видео или None) — все дни до сегодняшнего, старые первыми"""
+        today = datetime.now().strftime("%Y%m%d")
+        days = []
+        for name, (cam_config, _) in self.cameras.items():
+            root = cam_config.capture_dir
+            if not os.path.isdir(root):
+                continue
+            with os.scandir(root) as it:
+                for entry in it:
+                    if not entry.is_dir() or len(entry.name) != 8 or not entry.name.isdigit() or entry.name >= today:
+                        continue
+                    video = os.path.join(entry.path, f"video-{entry.name}.mp4")
+                    days.append((entry.name, name, entry.path, video if os.path.exists(video) else None))
+        days.sort()
+        return days
+
+    def _purge(self, camera, folder, reason):
+        cam_config, gui_queue = self.cameras[camera]
+        deleted = purge_frames(folder, max(1, self._get('retention_batch')), self._get('retention_pause_ms') / 1000)
+        if deleted:
+            logging.info(f"{cam_config.tag}Очистка ({reason}): удалено {deleted} кадров из {folder}")
+            gui_queue.put(('delete_done', deleted))
+
+    def _remove_video(self, camera, folder, video, reason):
+        cam_config, _ = self.cameras[camera]
+        # Кадры без видео очередь кодирования при запуске приняла бы за недоделанный день
+        # и собрала бы видео заново — уходят вместе с ним
+        if self._has_frames(folder) or os.path.isdir(os.path.join(folder, "segments")):
+            self._purge(camera, folder, reason)
+        remove_files([video])
+        logging.info(f"{cam_config.tag}Очистка ({reason}): удалено видео {os.path.basename(video)}")
+        try:
+            os.rmdir(folder)     # только если в папке дня больше ничего нет
+        except OSError:
+            pass
+
+    def _has_frames(self, folder):
+        with os.scandir(folder) as it:
+            return any(_is_frame(entry.name) or entry.name.endswith(".pack") for entry in it)
+
+    def check(self):
+        days = self._days()
+        now = datetime.now()
+
+        # По возрасту
+        frame_days = self._get('retention_frame_days')
+        video_days = self._get('retention_video_days')
+        for date_str, camera, folder, video in days:
+            age = now - datetime.strptime(date_str, "%Y%m%d")
+            if video and frame_days > 0 and age > timedelta(days=frame_days) and self._has_frames(folder):
+                self._purge(camera, folder, f"кадры старше {frame_days} дн.")
+            if video and video_days > 0 and age > timedelta(days=video_days) and os.path.exists(video):
+                self._remove_video(camera, folder, video, f"видео старше {video_days} дн.")
+
+        # По размеру и свободному месту: сначала кадры дней с видео, потом сами видео — старые первыми
+        max_bytes = self._get('retention_max_gb') * 1024 ** 3
+        min_free = self._get('retention_min_free_gb') * 1024 ** 3
+        if max_bytes <= 0 and min_free <= 0:
+            return
+        days = [d for d in self._days() if d[3]]
+        sizes = {folder: folder_size(folder) for _, _, folder, _ in days}
+        total = sum(folder_size(cam_config.capture_dir) for cam_config, _ in self.cameras.values()
+                    if os.path.isdir(cam_config.capture_dir))
+        root = next((c.capture_dir for c, _ in self.cameras.values() if os.path.isdir(c.capture_dir)), None)
+        if root is None:
+            return
+
+        def pressure():
+            over_size = max_bytes > 0 and total > max_bytes
+            low_free = min_free > 0 and shutil.disk_usage(root).free < min_free
+            return over_size or low_free
+
+        if not pressure():
+            return
+        logging.warning(f"Хранилище: {total / 1024 ** 3:.1f} ГБ, свободно {shutil.disk_usage(root).free / 1024 ** 3:.1f} ГБ "
+                        f"— очистка старых дней")
+        for date_str, camera, folder, video in days:
+            if not pressure():
+                return
+            if self._has_frames(folder):
+                self._purge(camera, folder, "нехватка места")
+                size = folder_size(folder)
+                total -= sizes[folder] - size
+                sizes[folder] = size
+        for date_str, camera, folder, video in days:
+            if not pressure():
+                return
+            size = os.path.getsize(video)
+            self._remove_video(camera, folder, video, "нехватка места")
+            total -= size
+        if pressure():
+            logging.warning("Хранилище: удалять больше нечего — остались только дни без видео и сегодняшний")
@@ -0,0 +1,157 @@
+import time
+import logging
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# ----------------------------------------------------------------------
+# Кольцевой буфер кадров в общей памяти.
+# Раскладка: заголовок кольца | заголовки слотов | данные слотов.
+# Один процесс пишет, читатели (кодер, анализ, превью — в том числе из других
+# процессов) получают кадры как NumPy-представления без копирования.
+# ----------------------------------------------------------------------
+RING_MAGIC = 0x43434652          # "CCFR"
+ALIGN = 64
+
+RING_HEADER = np.dtype([
+    ('magic', '<u4'),
+    ('slots', '<u4'),
+    ('slot_bytes', '<u8'),
+    ('write_seq', '<u8'),        # номер последнего записанного кадра, 0 — кадров ещё не было
+])
+SLOT_HEADER = np.dtype([
+    ('seq', '<u8'),              # 0 — слот пуст или переписывается
+    ('timestamp', '<f8'),        # time.time() кадра
+    ('width', '<u4'),
+    ('height', '<u4'),
+    ('stride', '<u4'),           # байт на строку
+    ('channels', '<u4'),
+])
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class RingFrame:
+    """Кадр из кольца: image — представление прямо в общей памяти.
+    Пока кадр используется, писатель может занять слот снова — после работы проверьте ring.valid(seq)."""
+    __slots__ = ('seq', 'timestamp', 'image')
+
+    def __init__(self, seq, timestamp, image):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+
+
+class FrameRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.lock = threading.Lock()      # воркеры записи одного процесса пишут по очереди
+        self.ring = np.ndarray((), RING_HEADER, buffer=shm.buf, offset=0)
+        if self.ring['magic'] != RING_MAGIC:
+            raise ValueError(f"{shm.name}: не кольцо кадров")
+        self.slots = int(self.ring['slots'])
+        self.slot_bytes = int(self.ring['slot_bytes'])
+        headers_offset = _align(RING_HEADER.itemsize)
+        self.headers = np.ndarray((self.slots,), SLOT_HEADER, buffer=shm.buf, offset=headers_offset)
+        self.data_offset = _align(headers_offset + SLOT_HEADER.itemsize * self.slots)
+        self.too_big = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, slots, slot_bytes, name=None):
+        slot_bytes = _align(slot_bytes)
+        size = _align(_align(RING_HEADER.itemsize) + SLOT_HEADER.itemsize * slots) + slots * slot_bytes
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        ring = np.ndarray((), RING_HEADER, buffer=shm.buf, offset=0)
+        ring['slots'] = slots
+        ring['slot_bytes'] = slot_bytes
+        ring['write_seq'] = 0
+        ring['magic'] = RING_MAGIC
+        del ring
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Подключение читателя из другого процесса по имени кольца"""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # До Python 3.13 читатель регистрируется в resource_tracker; дочерние процессы
+            # multiprocessing делят трекер с владельцем, так что память не удалится раньше времени
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    def _view(self, slot, width, height, stride, channels):
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        strides = (stride, channels, 1) if channels > 1 else (stride, 1)
+        return np.ndarray(shape, np.uint8, buffer=self.shm.buf,
+                          offset=self.data_offset + slot * self.slot_bytes, strides=strides)
+
+    def write(self, frame, timestamp=None):
+        """Копирует кадр (uint8, HxW или HxWxC) в следующий слот. Возвращает его номер или None, если не влез"""
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        stride = width * channels
+        if height * stride > self.slot_bytes:
+            self.too_big += 1
+            if self.too_big == 1:
+                logging.warning(f"Кадр {width}x{height} больше слота кольца ({self.slot_bytes} байт) — пропущен")
+            return None
+
+        with self.lock:
+            seq = int(self.ring['write_seq']) + 1
+            slot = seq % self.slots
+            header = self.headers[slot]
+            # Номер слота обнуляется на время записи: читатель увидит, что кадр уже не тот
+            header['seq'] = 0
+            np.copyto(self._view(slot, width, height, stride, channels), frame)
+            header['timestamp'] = time.time() if timestamp is None else timestamp
+            header['width'] = width
+            header['height'] = height
+            header['stride'] = stride
+            header['channels'] = channels
+            header['seq'] = seq
+            self.ring['write_seq'] = seq
+        return seq
+
+    def get(self, seq):
+        """Кадр с номером seq, если он ещё в кольце; иначе None"""
+        if seq <= 0:
+            return None
+        header = self.headers[seq % self.slots]
+        if int(header['seq']) != seq:
+            return None
+        image = self._view(seq % self.slots, int(header['width']), int(header['height']),
+                           int(header['stride']), int(header['channels']))
+        image.flags.writeable = False
+        frame = RingFrame(seq, float(header['timestamp']), image)
+        return frame if self.valid(seq) else None
+
+    def latest(self):
+        return self.get(int(self.ring['write_seq']))
+
+    def valid(self, seq):
+        """Слот всё ещё держит кадр seq — данные представления не переписаны"""
+        return int(self.headers[seq % self.slots]['seq']) == seq
+
+    def close(self):
+        # Представления держат буфер — без их удаления SharedMemory.close() падает с BufferError
+        self.ring = None
+        self.headers = None
+        try:
+            self.shm.close()
+        except BufferError:
+            logging.warning(f"Кольцо {self.shm.name}: кадры ещё используются, память освободится при выходе")
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -10,20 +10,20 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QGridLayout, QLabel, QPushButton, QProgressBar, QTextEdit,
     QFrame, QStackedWidget, QMessageBox,
-    QCheckBox
+    QCheckBox, QComboBox, QPlainTextEdit, QLineEdit
 )
 from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QIcon, QFont, QPixmap
+from PyQt6.QtGui import QIcon, QFont, QPixmap, QImage
 
 from ruamel.yaml import YAML
 from watchdog.observers import Observer
 
+from main_pack import load_frame
 from main_classes import (
-    FrameCapture, VideoEncoder, ConfigManager, CaptureAppGUI,
-    BrowserDriver, ConfigWatcher, cleanup_processes
+    ConfigManager, CameraConfig, CaptureScheduler, ConfigWatcher, BROWSER_POOL
 )
 
-from main_function import get_current_log_path, validate_config, resource_path
+from main_function import get_current_log_path, validate_config, resource_path, LogTail, LOG_LEVELS
 
 
 class CaptureGUI(QMainWindow):
@@ -55,6 +55,12 @@ class CaptureGUI(QMainWindow):
         self.deleted_count = 0
         self.current_video_date = datetime.now().strftime("%Y%m%d")
 
+        # Камеры: на странице статуса показывается выбранная, по остальным копим последние сообщения
+        self.current_camera = self.config_manager.get_cameras()[0]
+        self.camera_messages = {}
+        self.scheduler = None
+        self.tick_info = ""
+
         self.init_ui()
         self.start_background()
         self.setup_timers()
@@ -96,8 +102,13 @@ class CaptureGUI(QMainWindow):
         row = 0
         BTN_WIDTH = 120
 
-        # Кнопки Настройки / Лог
+        # Выбор камеры / Кнопки Настройки / Лог
         btn_container = QHBoxLayout()
+        self.camera_combo = QComboBox()
+        self.camera_combo.addItems(self.config_manager.get_cameras())
+        self.camera_combo.currentTextChanged.connect(self.select_camera)
+        self.camera_combo.setVisible(len(self.config_manager.get_cameras()) > 1)
+        btn_container.addWidget(self.camera_combo)
         btn_container.addStretch()
         btn_settings = QPushButton("Настройки")
         btn_settings.setFixedWidth(BTN_WIDTH)
@@ -242,9 +253,27 @@ class CaptureGUI(QMainWindow):
         page = QWidget()
         layout = QVBoxLayout(page)
 
-        self.log_text = QTextEdit()
+        filter_layout = QHBoxLayout()
+        self.log_level_combo = QComboBox()
+        self.log_level_combo.addItem("Все записи", 'INFO')
+        self.log_level_combo.addItem("Предупреждения и ошибки", 'WARNING')
+        self.log_level_combo.addItem("Только ошибки", 'ERROR')
+        self.log_level_combo.currentIndexChanged.connect(self.rebuild_log_display)
+        filter_layout.addWidget(self.log_level_combo)
+        self.log_search = QLineEdit()
+        self.log_search.setPlaceholderText("Поиск")
+        self.log_search.textChanged.connect(self.rebuild_log_display)
+        filter_layout.addWidget(self.log_search)
+        layout.addLayout(filter_layout)
+
+        # Окно держит не больше log_view_lines строк — старые вытесняются, новые дописываются в конец
+        max_lines = max(100, int(self.config_manager.get('log_view_lines', 2000)))
+        self.log_tail = LogTail(get_current_log_path(), max_lines)
+        self.log_text = QPlainTextEdit()
         self.log_text.setFont(QFont("Consolas", 10))
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(max_lines)
+        self.log_text.setPlaceholderText("# Файл capture.log не найден")
         layout.addWidget(self.log_text)
 
         bottom_layout = QHBoxLayout()
@@ -265,10 +294,33 @@ class CaptureGUI(QMainWindow):
     # ============================================================
     # Вспомогательные функции
     # ============================================================
+    @property
+    def frame_capture(self):
+        return self.scheduler.controllers[self.current_camera].frame_capture
+
     def _get_video_path(self, date_str=None):
         if date_str is None:
             date_str = datetime.now().strftime("%Y%m%d")
-        return os.path.join("capture", date_str, f"video-{date_str}.mp4")
+        capture_dir = CameraConfig(self.config_manager, self.current_camera).capture_dir
+        return os.path.join(capture_dir, date_str, f"video-{date_str}.mp4")
+
+    def select_camera(self, name):
+        self.current_camera = name
+        self.video_total_frames = 0
+        self.video_processed_frames = 0
+        self.is_encoding_now = False
+        self.deleting_in_progress = False
+        self.total_to_delete = 0
+        self.deleted_count = 0
+        self.last_frame_path = None
+        self.tick_info = ""
+        self.video_pb.setMaximum(1)
+        self.video_pb.setValue(0)
+        self.video_pb.setTextVisible(False)
+        self.update_status_display()
+        # Восстанавливаем состояние камеры из последних её сообщений
+        for msg in list(self.camera_messages.get(name, {}).values()):
+            self.handle_message(msg)
 
     def update_video_status_display(self):
         today = datetime.now().strftime("%Y%m%d")
@@ -328,12 +380,33 @@ class CaptureGUI(QMainWindow):
             QTimer.singleShot(0, lambda: self.setFixedSize(560, 380))
         self.update_preview()
 
+    def _ring_pixmap(self):
+        """Последний принятый кадр из кольца в общей памяти — без чтения файла с диска"""
+        if self.scheduler is None or self.last_frame_path is None:
+            return None
+        ring = self.frame_capture.ring
+        frame = ring.latest() if ring is not None else None
+        if frame is None or frame.image.ndim != 3:
+            return None
+        img = frame.image
+        qimage = QImage(img.data, img.shape[1], img.shape[0], img.strides[0], QImage.Format.Format_BGR888)
+        pixmap = QPixmap.fromImage(qimage)
+        return pixmap if ring.valid(frame.seq) else None
+
     def update_preview(self):
-        if not self.show_preview or not self.last_frame_path or not os.path.exists(self.last_frame_path):
+        pixmap = self._ring_pixmap() if self.show_preview else None
+        if pixmap is None and (not self.show_preview or not self.last_frame_path):
             self.preview_label.setPixmap(QPixmap())
             self.preview_label.setText("Последний кадр появится здесь" if self.show_preview else "")
             return
-        pixmap = QPixmap(self.last_frame_path)
+        if pixmap is None:
+            pixmap = QPixmap(self.last_frame_path)
+            if pixmap.isNull():
+                # frame_storage: pack — отдельного файла нет, кадр читается из пакета дня
+                writer = self.frame_capture.pack if self.scheduler is not None else None
+                data = load_frame(self.last_frame_path, writer)
+                if data:
+                    pixmap.loadFromData(data)
         if pixmap.isNull():
             self.preview_label.setText("Ошибка загрузки изображения")
             return
@@ -378,21 +451,35 @@ class CaptureGUI(QMainWindow):
         else:
             self.log_timer.stop()
 
+    def _log_filter(self):
+        min_level = LOG_LEVELS.index(self.log_level_combo.currentData())
+        needle = self.log_search.text().strip().lower()
+        return lambda level, line: LOG_LEVELS.index(level) >= min_level and needle in line.lower()
+
     def update_log_display(self):
-        log_path = get_current_log_path()
-        if not os.path.exists(log_path):
-            self.log_text.setPlainText("# Файл capture.log не найден")
-            return
+        """Дописывает только новые строки лога — стоимость не зависит от размера файла"""
         try:
-            with open(log_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            self.log_text.setPlainText(content)
-            cursor = self.log_text.textCursor()
-            cursor.movePosition(cursor.MoveOperation.End)
-            self.log_text.setTextCursor(cursor)
-            self.log_text.ensureCursorVisible()
+            new = self.log_tail.poll()
         except Exception as e:
-            self.log_text.setPlainText(f"# Ошибка чтения capture.log: {e}")
+            self.log_text.appendPlainText(f"# Ошибка чтения capture.log: {e}")
+            return
+        match = self._log_filter()
+        lines = [line for level, line in new if match(level, line)]
+        if not lines:
+            return
+        bar = self.log_text.verticalScrollBar()
+        at_end = bar.value() >= bar.maximum() - 2
+        self.log_text.appendPlainText("\n".join(lines))
+        # Пользователь пролистал вверх — не дёргаем его к концу
+        if at_end:
+            bar.setValue(bar.maximum())
+
+    def rebuild_log_display(self):
+        """Смена фильтра: окно заполняется из строк, уже прочитанных в память"""
+        match = self._log_filter()
+        self.log_text.setPlainText("\n".join(line for level, line in self.log_tail.lines if match(level, line)))
+        bar = self.log_text.verticalScrollBar()
+        bar.setValue(bar.maximum())
 
     def save_config(self):
         try:
@@ -419,7 +506,7 @@ class CaptureGUI(QMainWindow):
             self.show_settings_page()
 
     def update_status_display(self):
-        cfg = self.config_manager.config
+        cfg = self.config_manager.camera_config(self.current_camera)
         for key, lbl in self.status_labels.items():
             lbl.setText(str(cfg[key]))
         delete = "Да" if cfg['delete_frames_after_video'] else "Нет"
@@ -428,11 +515,8 @@ class CaptureGUI(QMainWindow):
         self.update_video_status_display()
 
     def start_background(self):
-        self.driver = BrowserDriver(self.config_manager)
-        self.frame_capture = FrameCapture(self.config_manager, self.driver)
-        self.encoder = VideoEncoder(self.config_manager, self.gui_queue, self.frame_capture)
-        self.app = CaptureAppGUI(self.config_manager, self.driver, self.frame_capture, self.encoder, self.gui_queue, self.config_queue)
-        threading.Thread(target=self.app.run, daemon=True).start()
+        self.scheduler = CaptureScheduler(self.config_manager, self.gui_queue, self.config_queue)
+        self.scheduler.start()
         self.start_watchdog()
 
     def start_watchdog(self):
@@ -453,92 +537,124 @@ class CaptureGUI(QMainWindow):
         try:
             while True:
                 msg = self.gui_queue.get_nowait()
-                typ = msg[0]
-
-                if typ == 'status':
-                    total = msg[1]
-                    info = msg[2]
-                    self.captured_count_label.setText(f"Сохранено кадров за текущие сутки: {total}")
-
-                    if isinstance(info, str) and info.startswith("stop:"):
-                        self.last_frame_status_label.setText(f"Захват остановлен до {info[5:]}")
-                        self.last_frame_status_label.setStyleSheet("color: red;")
-                        self.last_frame_path = None
-                        self.update_preview()
-                    else:
-                        if info and os.path.exists(info):
-                            self.last_frame_path = info
-                            self.last_frame_status_label.setText(f"Последний кадр: {os.path.basename(info)}")
-                            self.last_frame_status_label.setStyleSheet("color: black;")
-                            self.update_preview()
-                        else:
-                            self.last_frame_status_label.setText("Последний кадр: Нет")
-                            self.last_frame_status_label.setStyleSheet("color: black;")
-                            self.last_frame_path = None
-                        self.update_preview()
-
-                    self.update_video_status_display()
-
-                elif typ == 'video_prepare':
-                    self.is_encoding_now = True
-                    self.deleting_in_progress = False
-                    self.update_video_status_display()
-
-                elif typ == 'video_start':
-                    self.video_total_frames = msg[1]
-                    self.video_processed_frames = 0
-                    self.is_encoding_now = True
-                    self.deleting_in_progress = False
-                    self.video_pb.setMaximum(self.video_total_frames)
-                    self.video_pb.setValue(0)
-                    self.video_pb.setTextVisible(True)
-                    self.update_video_status_display()
-
-                elif typ == 'video_progress':
-                    self.video_processed_frames = msg[1]
-                    self.video_pb.setValue(self.video_processed_frames)
-                    self.update_video_status_display()
-
-                elif typ == 'video_done':
-                    self.is_encoding_now = False
-                    self.video_pb.setMaximum(1)
-                    self.video_pb.setValue(0)
-                    self.video_pb.setTextVisible(False)
-
-                    if self.config_manager['delete_frames_after_video']:
-                        self.deleting_in_progress = True
-                        self.total_to_delete = self.video_total_frames
-                        self.deleted_count = 0
-                    else:
-                        self.deleting_in_progress = False
-
-                    self.update_video_status_display()
-
-                elif typ == 'delete_done':
-                    deleted = msg[1]
-                    self.deleted_count = deleted
-                    self.deleting_in_progress = False
-                    self.update_video_status_display()
-
-                elif typ == 'capture_progress':
-                    self.capture_pb.setValue(int(msg[1]))
-                    self.time_status_label.setText(f"Время: {msg[2]} | Осталось: {msg[3]}")
-                    if msg[1] == 0 and msg[2] == "--:--":
-                        self.capture_pb.setTextVisible(False)
-                    else:
-                        self.capture_pb.setTextVisible(True)
-
-                elif typ == 'config_update':
-                    self.update_status_display()
-                    self.app.reset_video_trigger()
-
+                if msg[0] == 'camera':
+                    camera, msg = msg[1], msg[2]
+                    stored = self.camera_messages.setdefault(camera, {})
+                    stored.pop(msg[0], None)
+                    stored[msg[0]] = msg
+                    if camera != self.current_camera:
+                        continue
+                self.handle_message(msg)
         except queue.Empty:
             pass
 
+    def handle_message(self, msg):
+        typ = msg[0]
+
+        if typ == 'status':
+            total = msg[1]
+            info = msg[2]
+            self.captured_count_label.setText(f"Сохранено кадров за текущие сутки: {total}")
+
+            if isinstance(info, str) and info.startswith("stop:"):
+                self.last_frame_status_label.setText(f"Захват остановлен до {info[5:]}")
+                self.last_frame_status_label.setStyleSheet("color: red;")
+                self.last_frame_path = None
+            else:
+                # Без сохранения JPEG (keep_frames: false) кадр есть только в кольце общей памяти
+                in_ring = self.scheduler is not None and self.frame_capture.ring is not None
+                packed = self.config_manager.camera_config(self.current_camera).get('frame_storage', 'files') == 'pack'
+                if info and (os.path.exists(info) or in_ring or packed):
+                    self.last_frame_path = info
+                    self.last_frame_status_label.setText(f"Последний кадр: {os.path.basename(info)}")
+                    self.last_frame_status_label.setStyleSheet("color: black;")
+                else:
+                    self.last_frame_status_label.setText("Последний кадр: Нет")
+                    self.last_frame_status_label.setStyleSheet("color: black;")
+                    self.last_frame_path = None
+            self.update_preview()
+
+            self.update_video_status_display()
+
+        elif typ == 'video_prepare':
+            self.is_encoding_now = True
+            self.deleting_in_progress = False
+            self.update_video_status_display()
+
+        elif typ == 'video_start':
+            self.video_total_frames = msg[1]
+            self.video_processed_frames = 0
+            self.is_encoding_now = True
+            self.deleting_in_progress = False
+            self.video_pb.setMaximum(self.video_total_frames)
+            self.video_pb.setValue(0)
+            self.video_pb.setTextVisible(True)
+            self.update_video_status_display()
+
+        elif typ == 'video_progress':
+            self.video_processed_frames = msg[1]
+            self.video_pb.setValue(self.video_processed_frames)
+            self.update_video_status_display()
+
+        elif typ == 'video_done':
+            self.is_encoding_now = False
+            self.video_pb.setMaximum(1)
+            self.video_pb.setValue(0)
+            self.video_pb.setTextVisible(False)
+
+            if self.config_manager['delete_frames_after_video']:
+                self.deleting_in_progress = True
+                self.total_to_delete = self.video_total_frames
+                self.deleted_count = 0
+            else:
+                self.deleting_in_progress = False
+
+            self.update_video_status_display()
+
+        elif typ == 'delete_done':
+            deleted = msg[1]
+            self.deleted_count = deleted
+            self.deleting_in_progress = False
+            self.update_video_status_display()
+
+        elif typ == 'capture_progress':
+            self.capture_pb.setValue(int(msg[1]))
+            self.time_status_label.setText(f"Время: {msg[2]} | Осталось: {msg[3]}{self.tick_info}")
+            if msg[1] == 0 and msg[2] == "--:--":
+                self.capture_pb.setTextVisible(False)
+            else:
+                self.capture_pb.setTextVisible(True)
+
+        elif typ == 'tick_stats':
+            ticks, late, missed, interval, cost = msg[1:]
+            info = f" | Пропущено тактов: {missed}" if missed else ""
+            if abs(interval - float(self.config_manager.camera_config(self.current_camera)['time_period_interval'])) > 1e-6:
+                info += f" | Интервал: {interval:.2f} с"
+            self.tick_info = info
+
+        elif typ == 'motion_stats':
+            stored, skipped, bursts, bursting = msg[1:]
+            text = self.captured_count_label.text().split(" | ")[0]
+            info = f" | Без изменений пропущено: {skipped}"
+            if bursting:
+                info += " | Движение"
+            self.captured_count_label.setText(text + info)
+
+        elif typ == 'browser_stats':
+            rss = sum(st['rss_mb'] for st in msg[1])
+            restarts = sum(st['restarts'] for st in msg[1])
+            self.setWindowTitle(f"Захват кадров с камеры ... | Chrome: {len(msg[1])}, {rss:.0f} МБ, перезапусков {restarts}")
+
+        elif typ == 'config_update':
+            self.update_status_display()
+            self.scheduler.reset_video_trigger()
+
     def closeEvent(self, event):
         reply = QMessageBox.question(self, 'Выход', 'Остановить захват?', QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            cleanup_processes()
+            if self.scheduler is not None:
+                self.scheduler.shutdown()
+            BROWSER_POOL.shutdown()
             event.accept()
         else:
             event.ignore()
\ No newline at end of file
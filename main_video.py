@@ -0,0 +1,941 @@
+import os
+import sys
+import json
+import bisect
+import time
+import queue
+import heapq
+import collections
+import shutil
+import logging
+import threading
+import subprocess
+import glob
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import cv2
+import psutil
+import numpy as np
+
+from main_pack import pack_entries, delete_pack, release_pack
+from main_index import drop_index, day_index
+from main_retention import remove_files
+
+
+SEGMENT_DIR = "segments"
+SEGMENT_MANIFEST = "segments.json"
+
+
+# ----------------------------------------------------------------------
+# ffmpeg (необязателен: без него склейка идёт через OpenCV)
+# ----------------------------------------------------------------------
+def find_ffmpeg(name="ffmpeg"):
+    if os.path.isfile(name):
+        return name
+    if getattr(sys, 'frozen', False):
+        bundled = os.path.join(sys._MEIPASS, "ffmpeg.exe")
+        if os.path.isfile(bundled):
+            return bundled
+    return shutil.which(name)
+
+
+def no_window():
+    """Параметры subprocess, чтобы под Windows не всплывало окно консоли"""
+    if sys.platform.startswith('win'):
+        return {'creationflags': subprocess.CREATE_NO_WINDOW}
+    return {}
+
+
+# ----------------------------------------------------------------------
+# Бэкенды записи видео: open(path, fps, size) → write(...) → close()
+# ----------------------------------------------------------------------
+class OpenCVBackend:
+    """cv2.VideoWriter, mp4v — работает без внешних программ"""
+    name = "opencv"
+    needs_frames = True     # write() принимает декодированный BGR-кадр
+
+    def __init__(self, config):
+        self.config = config
+        self.writer = None
+
+    def open(self, path, fps, size):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        if not self.writer.isOpened():
+            raise RuntimeError(f"cv2.VideoWriter не открылся: {path}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class FFmpegPipeBackend:
+    """Сырые BGR-кадры в stdin ffmpeg → libx264/libx265 с preset и CRF из конфига"""
+    name = "ffmpeg"
+    needs_frames = True
+
+    def __init__(self, config, exe):
+        self.config = config
+        self.exe = exe
+        self.proc = None
+        self.path = None
+
+    def _output_args(self, size):
+        w, h = size
+        codec = self.config.get('video_codec', 'libx264')
+        return [
+            # yuv420p требует чётных сторон
+            '-vf', f"scale={w - w % 2}:{h - h % 2}",
+            '-c:v', codec,
+            '-preset', str(self.config.get('video_preset', 'veryfast')),
+            '-crf', str(self.config.get('video_crf', 23)),
+            '-pix_fmt', 'yuv420p',
+        ] + (['-tag:v', 'hvc1'] if codec == 'libx265' else []) + ['-movflags', '+faststart', self.path]
+
+    def _input_args(self, fps, size):
+        return ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{size[0]}x{size[1]}", '-r', str(fps), '-i', '-']
+
+    def open(self, path, fps, size):
+        self.path = path
+        cmd = [self.exe, '-y', '-loglevel', 'error'] + self._input_args(fps, size) + self._output_args(size)
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE, **no_window())
+
+    def write(self, frame):
+        self.proc.stdin.write(frame.tobytes())
+
+    def close(self):
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        err = proc.stderr.read().decode('utf-8', 'replace').strip()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg завершился с кодом {proc.returncode}: {err[-500:]}")
+
+
+class FFmpegImage2Backend(FFmpegPipeBackend):
+    """JPEG-файлы как есть — ffmpeg сам их декодирует, Python кадры не трогает"""
+    name = "image2"
+    needs_frames = False    # write() принимает путь к JPEG или PackEntry
+
+    def _input_args(self, fps, size):
+        # Шаблон -pattern_type glob в сборках ffmpeg под Windows недоступен,
+        # поэтому байты файлов идут через image2pipe в порядке списка
+        return ['-f', 'image2pipe', '-c:v', 'mjpeg', '-framerate', str(fps), '-i', '-']
+
+    def write(self, item):
+        self.proc.stdin.write(_item_bytes(item))
+
+
+def make_backend(config):
+    name = config.get('video_backend', 'opencv')
+    if name in ('ffmpeg', 'image2'):
+        exe = find_ffmpeg(config.get('ffmpeg_path', 'ffmpeg'))
+        if exe:
+            return FFmpegPipeBackend(config, exe) if name == 'ffmpeg' else FFmpegImage2Backend(config, exe)
+        logging.warning(f"{config.tag}ffmpeg не найден — video_backend {name} заменён на opencv")
+    return OpenCVBackend(config)
+
+
+# ----------------------------------------------------------------------
+# Параллельное чтение кадров для кодирования
+# ----------------------------------------------------------------------
+def _item_name(item):
+    """Имя кадра для сортировки: путь к JPEG или PackEntry из пакета дня"""
+    return os.path.basename(item) if isinstance(item, str) else item.name
+
+
+def _item_bytes(item):
+    if isinstance(item, str):
+        with open(item, 'rb') as f:
+            return f.read()
+    return item.read()
+
+
+def _load_frame(item, size=None):
+    if isinstance(item, str):
+        frame = cv2.imread(item)
+    else:
+        # Из пакета: JPEG берётся прямо из отображённого в память файла
+        frame = cv2.imdecode(np.frombuffer(item.read(), np.uint8), cv2.IMREAD_COLOR)
+    if size is None:
+        return frame
+    if frame is not None and (frame.shape[1], frame.shape[0]) != size:
+        # Кадр другого размера испортил бы видео — приводим к размеру первого
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def prefetch_frames(paths, size, workers=0, max_mb=256):
+    """Кадры по порядку; чтение и декодирование идут заранее в пуле потоков (cv2 отпускает GIL).
+    Опережение ограничено max_mb — декодированные кадры больше не займут."""
+    workers = int(workers) or os.cpu_count() or 2
+    frame_bytes = size[0] * size[1] * 3
+    ahead = max(2, min(len(paths), int(max_mb * 1024 * 1024 // frame_bytes)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as pool:
+        pending = collections.deque()
+        it = iter(paths)
+        for path in it:
+            pending.append(pool.submit(_load_frame, path, size))
+            if len(pending) >= ahead:
+                break
+        while pending:
+            frame = pending.popleft().result()
+            path = next(it, None)
+            if path is not None:
+                pending.append(pool.submit(_load_frame, path, size))
+            yield frame
+
+
+def encode_items(config, backend, items, out_path, size, progress=None):
+    """Кадры одним файлом через backend; готовое видео появляется только целиком"""
+    tmp_path = out_path[:-4] + ".tmp.mp4"
+    total = len(items)
+    try:
+        backend.open(tmp_path, config['video_fps'], size)
+        if backend.needs_frames:
+            frames = prefetch_frames(items, size, config.get('encode_workers', 0),
+                                     float(config.get('encode_prefetch_mb', 256)))
+        else:
+            frames = items
+        for i, frame in enumerate(frames):
+            if frame is not None:
+                backend.write(frame)
+            # Обновляем прогресс реже — чтобы GUI не тормозил
+            if progress and ((i + 1) % 10 == 0 or i == total - 1):
+                progress(i + 1, total)
+    finally:
+        backend.close()
+    os.replace(tmp_path, out_path)
+
+
+# ----------------------------------------------------------------------
+# Кодирование кусками: каждый готовый кусок — контрольная точка,
+# прерванная работа продолжается с первого недоделанного куска
+# ----------------------------------------------------------------------
+ENCODE_KEYS = {
+    'video_backend': 'opencv',
+    'ffmpeg_path': 'ffmpeg',
+    'video_codec': 'libx264',
+    'video_preset': 'veryfast',
+    'video_crf': 23,
+    'encode_workers': 0,
+    'encode_prefetch_mb': 256,
+}
+
+
+class BackendConfig(dict):
+    """Снимок настроек кодирования, который можно передать в другой процесс"""
+    def __init__(self, config):
+        super().__init__({key: config.get(key, default) for key, default in ENCODE_KEYS.items()})
+        self.tag = config.tag
+
+
+class _Report:
+    """put() как у очереди, но сразу вызывает обработчик — для кусков в своём процессе"""
+    def __init__(self, handler):
+        self.handler = handler
+
+    def put(self, item):
+        self.handler(*item)
+
+
+def parts_dir(video_path):
+    return video_path[:-4] + ".parts"
+
+
+def _encode_part(cfg, paths, out_path, fps, size, index, progress, workers=2):
+    # Кусок пишется во временный файл: оборванный файл не примется за готовую контрольную точку
+    tmp_path = out_path[:-4] + ".tmp.mp4"
+    backend = make_backend(cfg)
+    backend.open(tmp_path, fps, size)
+    try:
+        if backend.needs_frames:
+            items = prefetch_frames(paths, size, workers, float(cfg['encode_prefetch_mb']) / 4)
+        else:
+            items = paths
+        for i, item in enumerate(items):
+            if item is not None:
+                backend.write(item)
+            if (i + 1) % 10 == 0 or i == len(paths) - 1:
+                progress.put((index, i + 1))
+    finally:
+        backend.close()
+    os.replace(tmp_path, out_path)
+
+
+def encode_chunks(cfg, paths, out_path, fps, size, processes=1, chunk=1000, progress=None, throttle=0.0):
+    """Кодирует paths кусками по chunk кадров (в processes процессах) и склеивает их без перекодирования.
+    throttle — доля паузы после каждого куска относительно времени его кодирования (фоновые задания)."""
+    part_dir = parts_dir(out_path)
+    state_path = os.path.join(part_dir, "job.json")
+    state = {
+        'frames': len(paths), 'chunk': chunk,
+        'first': _item_name(paths[0]), 'last': _item_name(paths[-1]),
+        'size': list(size), 'fps': fps,
+        # Все настройки кодирования: куски другого кодека или crf нельзя склеить через -c copy
+        **{key: cfg[key] for key in ENCODE_KEYS},
+    }
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except Exception:
+        previous = None
+    if previous != state:
+        # Кадры или настройки изменились — старые куски не подходят
+        shutil.rmtree(part_dir, ignore_errors=True)
+    os.makedirs(part_dir, exist_ok=True)
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+    count = (len(paths) + chunk - 1) // chunk
+    chunks = [paths[k * chunk:(k + 1) * chunk] for k in range(count)]
+    outs = [os.path.join(part_dir, f"part-{k:04d}.mp4") for k in range(count)]
+    todo = [k for k in range(count) if not os.path.exists(outs[k])]
+    done = [0 if k in todo else len(chunks[k]) for k in range(count)]
+    if len(todo) < count:
+        logging.info(f"{cfg.tag}Продолжение кодирования: готово {count - len(todo)}/{count} кусков")
+
+    reported = [0]
+
+    def update(k, n):
+        done[k] = n
+        total_done = sum(done)
+        # Общий прогресс всех кусков — не чаще, чем раньше давал один поток
+        if progress and (total_done - reported[0] >= 10 or total_done == len(paths)):
+            reported[0] = total_done
+            progress(total_done, len(paths))
+
+    if processes <= 1 or len(todo) <= 1:
+        for k in todo:
+            started = time.monotonic()
+            _encode_part(cfg, chunks[k], outs[k], fps, size, k, _Report(update), cfg['encode_workers'])
+            if throttle > 0:
+                time.sleep((time.monotonic() - started) * throttle)
+    else:
+        with multiprocessing.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=min(processes, len(todo))) as pool:
+            updates = manager.Queue()
+            futures = [pool.submit(_encode_part, cfg, chunks[k], outs[k], fps, size, k, updates) for k in todo]
+            while True:
+                try:
+                    update(*updates.get(timeout=0.5))
+                except queue.Empty:
+                    if all(f.done() for f in futures):
+                        break
+            for f in futures:
+                f.result()
+
+    # Готовое видео появляется только целиком
+    joined = os.path.join(part_dir, "joined.mp4")
+    concat_segments(outs, joined, fps, cfg['ffmpeg_path'])
+    os.replace(joined, out_path)
+    shutil.rmtree(part_dir, ignore_errors=True)
+
+
+# ----------------------------------------------------------------------
+# Сегменты дня: манифест закрытых сегментов лежит рядом с ними
+# ----------------------------------------------------------------------
+def read_segments(day_folder):
+    path = os.path.join(day_folder, SEGMENT_DIR, SEGMENT_MANIFEST)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.warning(f"Не удалось прочитать {path}: {e}")
+        return []
+
+
+def _append_segment(seg_dir, record):
+    path = os.path.join(seg_dir, SEGMENT_MANIFEST)
+    records = read_segments(os.path.dirname(seg_dir)) + [record]
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def concat_segments(paths, out_path, fps, ffmpeg="ffmpeg", progress=None):
+    """Склейка сегментов в один файл: ffmpeg без перекодирования, иначе — перепаковка через OpenCV"""
+    if len(paths) == 1:
+        shutil.copyfile(paths[0], out_path)
+        if progress:
+            progress(1, 1)
+        return
+
+    exe = find_ffmpeg(ffmpeg)
+    if exe:
+        list_path = out_path + ".concat.txt"
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for p in paths:
+                f.write(f"file '{os.path.abspath(p)}'\n")
+        try:
+            subprocess.run(
+                [exe, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                 '-c', 'copy', '-movflags', '+faststart', out_path],
+                check=True, capture_output=True, **no_window()
+            )
+        finally:
+            try: os.remove(list_path)
+            except: pass
+        if progress:
+            progress(len(paths), len(paths))
+        return
+
+    logging.info("ffmpeg не найден — сегменты склеиваются через OpenCV")
+    writer = None
+    try:
+        for i, p in enumerate(paths):
+            cap = cv2.VideoCapture(p)
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+                writer.write(frame)
+            cap.release()
+            if progress:
+                progress(i + 1, len(paths))
+    finally:
+        if writer is not None:
+            writer.release()
+
+
+# ----------------------------------------------------------------------
+# Потоковый кодер: принятые кадры сразу дописываются в текущий сегмент
+# ----------------------------------------------------------------------
+class SegmentEncoder:
+    REORDER = 4          # воркеры записи отдают кадры почти по порядку — небольшой буфер их выравнивает
+    IDLE_CLOSE = 60      # без кадров минуту (конец окна захвата) — сегмент закрывается
+
+    def __init__(self, config):
+        self.config = config
+        self.queue = queue.Queue()
+        self.pending = []
+        self.seq = 0
+        self.writer = None
+        self.segment_dir = None
+        self.segment_name = None
+        self.first_frame = None
+        self.last_frame = None
+        self.size = None
+        self.frames = 0
+        self.opened = 0.0
+        self.last_write = 0.0
+        threading.Thread(target=self._run, daemon=True, name="segment-encoder").start()
+
+    def add(self, file_path, frame):
+        """Кадр BGR с именем, под которым он лёг (или лёг бы) на диск"""
+        self.queue.put(('frame', file_path, frame))
+
+    def close(self, day_folder=None):
+        """Закрывает текущий сегмент и ждёт, пока он попадёт в манифест.
+        day_folder — только если сегмент этого дня: сегодняшний не обрываем ради задания за прошлый день"""
+        done = threading.Event()
+        self.queue.put(('close', done, day_folder))
+        done.wait(timeout=300)
+
+    def frame_count(self, day_folder):
+        count = sum(rec['frames'] for rec in read_segments(day_folder))
+        if self.segment_dir == os.path.join(day_folder, SEGMENT_DIR):
+            count += self.frames
+        return count
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=5)
+            except queue.Empty:
+                if self.pending:
+                    self._flush()
+                if self.writer is not None and time.monotonic() - self.last_write > self.IDLE_CLOSE:
+                    self._close_segment()
+                continue
+
+            try:
+                if item[0] == 'close':
+                    _, done, day_folder = item
+                    self._flush()
+                    if day_folder is None or (self.segment_dir is not None and os.path.normpath(self.segment_dir) ==
+                                              os.path.normpath(os.path.join(day_folder, SEGMENT_DIR))):
+                        self._close_segment()
+                    done.set()
+                    continue
+                _, path, frame = item
+                heapq.heappush(self.pending, (path, self.seq, frame))
+                self.seq += 1
+                while len(self.pending) > self.REORDER:
+                    path, _, frame = heapq.heappop(self.pending)
+                    self._write(path, frame)
+            except Exception as e:
+                logging.error(f"{self.config.tag}Ошибка потокового кодирования: {e}")
+
+    def _flush(self):
+        while self.pending:
+            path, _, frame = heapq.heappop(self.pending)
+            self._write(path, frame)
+
+    def _write(self, path, frame):
+        seg_dir = os.path.join(os.path.dirname(path), SEGMENT_DIR)
+        now = time.monotonic()
+        max_age = float(self.config.get('segment_minutes', 30)) * 60
+        if self.writer is not None and (seg_dir != self.segment_dir or now - self.opened >= max_age):
+            self._close_segment()
+
+        name = os.path.basename(path)
+        if self.writer is None:
+            os.makedirs(seg_dir, exist_ok=True)
+            h, w = frame.shape[:2]
+            self.size = (w, h)
+            self.segment_dir = seg_dir
+            self.segment_name = f"seg-{name[5:-4]}.mp4"
+            self.writer = cv2.VideoWriter(os.path.join(seg_dir, self.segment_name),
+                                          cv2.VideoWriter_fourcc(*'mp4v'), self.config['video_fps'], self.size)
+            self.first_frame = name
+            self.frames = 0
+            self.opened = now
+
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        self.writer.write(frame)
+        self.frames += 1
+        self.last_frame = name
+        self.last_write = now
+
+    def _close_segment(self):
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        # В манифест попадают только закрытые сегменты: недописанный после сбоя файл не склеивается
+        _append_segment(self.segment_dir, {
+            'file': self.segment_name,
+            'frames': self.frames,
+            'first': self.first_frame,
+            'last': self.last_frame,
+        })
+        logging.info(f"{self.config.tag}Сегмент закрыт: {self.segment_name} ({self.frames} кадров)")
+        self.segment_dir = None
+        self.frames = 0
+
+
+# ----------------------------------------------------------------------
+# Видеокодер — теперь ищет .jpg
+# ----------------------------------------------------------------------
+class VideoEncoder:
+    def __init__(self, config, gui_queue, frame_capture):
+        self.config = config
+        self.gui_queue = gui_queue
+        self.frame_capture = frame_capture  # нужен для сегментов потокового режима; в процессе кодирования — None
+
+    def _day_folder(self, date_str):
+        return os.path.join(self.config.capture_dir, date_str)
+
+    def _get_video_path(self, date_str):
+        folder = self._day_folder(date_str)
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"video-{date_str}.mp4")
+
+    def encode(self, date_str, background=False):
+        """Создаёт видео из всех JPG-кадров за указанную дату.
+        background — задание из очереди за прошлые дни: один процесс и пауза после каждого куска"""
+        folder = self._day_folder(date_str)
+        pattern = os.path.join(folder, "capt-*.jpg")
+        # Кадры дня — отдельные JPEG и/или пакет frames-<дата>.pack
+        frames = sorted(glob.glob(pattern) + pack_entries(folder), key=_item_name)
+
+        segments = getattr(self.frame_capture, 'segments', None)
+        if segments is not None:
+            segments.close(folder)
+        parts = read_segments(folder)
+        if parts:
+            return self._finalize_segments(date_str, folder, parts, frames)
+
+        if not frames:
+            logging.info(f"{self.config.tag}Нет JPG-кадров для конвертации за {date_str}")
+            self.gui_queue.put(('video_done', "Нет кадров для видео"))
+            return True
+
+        # Читаем первый кадр для размеров
+        first_frame = _load_frame(frames[0])
+        if first_frame is None:
+            logging.error(f"{self.config.tag}Не удалось прочитать первый кадр")
+            return False
+        h, w = first_frame.shape[:2]
+
+        video_path = self._get_video_path(date_str)
+        backend = make_backend(self.config)
+
+        total = len(frames)
+        self.gui_queue.put(('video_prepare',))
+        self.gui_queue.put(('video_start', total))
+
+        started = time.monotonic()
+        processes = 1 if background else int(self.config.get('encode_processes', 1)) or os.cpu_count() or 1
+        try:
+            if find_ffmpeg(self.config.get('ffmpeg_path', 'ffmpeg')):
+                # Кусками с контрольными точками: после сбоя кодирование продолжится, а не начнётся заново
+                encode_chunks(BackendConfig(self.config), frames, video_path, self.config['video_fps'], (w, h),
+                              processes, int(self.config.get('checkpoint_frames', 1000)),
+                              lambda done, count: self.gui_queue.put(('video_progress', done, count)),
+                              float(self.config.get('background_throttle', 1.0)) if background else 0.0)
+                name = backend.name if processes <= 1 else f"{backend.name} ×{processes}"
+            else:
+                self._encode_single(backend, frames, video_path, (w, h))
+                name = backend.name
+        except Exception as e:
+            # Видео не получилось — кадры не удаляем
+            logging.error(f"{self.config.tag}Ошибка кодирования ({backend.name}) за {date_str}: {e}")
+            self.gui_queue.put(('video_done', f"Ошибка кодирования видео ({backend.name})"))
+            return False
+
+        self._report_video(date_str, video_path, total, name, started)
+        self._delete_frames(frames)
+        return True
+
+    def _encode_single(self, backend, frames, video_path, size):
+        """Без ffmpeg: одним файлом"""
+        encode_items(self.config, backend, frames, video_path, size,
+                     lambda done, total: self.gui_queue.put(('video_progress', done, total)))
+
+    def _report_video(self, date_str, video_path, total, backend_name, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        size_mb = os.path.getsize(video_path) / 1024 / 1024 if os.path.exists(video_path) else 0
+        summary = (f"Видео создано: video-{date_str}.mp4 ({total} кадров, {backend_name}, "
+                   f"{size_mb:.1f} МБ, {total / elapsed:.0f} кадр/с)")
+        self.gui_queue.put(('video_done', summary))
+        logging.info(f"{self.config.tag}{summary}")
+
+    def _finalize_segments(self, date_str, folder, parts, frames):
+        """Потоковый режим: кадры уже в сегментах — остаётся склеить их без перекодирования"""
+        seg_dir = os.path.join(folder, SEGMENT_DIR)
+        self.gui_queue.put(('video_prepare',))
+        try:
+            parts = self._fill_gaps(seg_dir, parts, frames)
+        except Exception as e:
+            # Кадры вне сегментов не попали бы в видео — ничего не удаляем
+            logging.error(f"{self.config.tag}Не удалось закодировать кадры вне сегментов за {date_str}: {e}")
+            self.gui_queue.put(('video_done', "Ошибка кодирования кадров вне сегментов"))
+            return False
+        paths = [os.path.join(seg_dir, rec['file']) for rec in parts]
+        total = sum(rec['frames'] for rec in parts)
+        self.gui_queue.put(('video_start', total))
+
+        done = [0]
+        counts = [rec['frames'] for rec in parts]
+
+        def progress(n, _):
+            done[0] = sum(counts[:n])
+            self.gui_queue.put(('video_progress', done[0], total))
+
+        video_path = self._get_video_path(date_str)
+        tmp_path = video_path[:-4] + ".tmp.mp4"
+        try:
+            concat_segments(paths, tmp_path, self.config['video_fps'],
+                            self.config.get('ffmpeg_path', 'ffmpeg'), progress)
+            os.replace(tmp_path, video_path)
+        except Exception as e:
+            logging.error(f"{self.config.tag}Не удалось склеить сегменты за {date_str}: {e}")
+            self.gui_queue.put(('video_done', "Ошибка склейки сегментов"))
+            return False
+
+        summary = f"Видео создано: video-{date_str}.mp4 ({total} кадров, сегментов: {len(parts)})"
+        self.gui_queue.put(('video_done', summary))
+        logging.info(f"{self.config.tag}{summary}")
+
+        shutil.rmtree(seg_dir, ignore_errors=True)
+        self._delete_frames(frames)
+        return True
+
+    def _fill_gaps(self, seg_dir, parts, frames):
+        """Кадры дня, не вошедшие ни в один закрытый сегмент (сегмент не закрылся при выходе или сбое,
+        режим streaming включили посреди дня), — в дополнительные сегменты тем же кодеком.
+        Возвращает все сегменты по порядку времени"""
+        parts = sorted(parts, key=lambda rec: rec['first'])
+        firsts = [rec['first'] for rec in parts]
+        gaps = collections.defaultdict(list)
+        for item in frames:
+            name = _item_name(item)
+            k = bisect.bisect_right(firsts, name)
+            if k and name <= parts[k - 1]['last']:
+                continue       # кадр уже в сегменте
+            gaps[k].append(item)
+        if not gaps:
+            return parts
+
+        cap = cv2.VideoCapture(os.path.join(seg_dir, parts[0]['file']))
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+        if not all(size):
+            raise RuntimeError(f"не прочитать размер сегмента {parts[0]['file']}")
+        added = []
+        for items in gaps.values():
+            first, last = _item_name(items[0]), _item_name(items[-1])
+            record = {'file': f"gap-{first[5:-4]}.mp4", 'frames': len(items), 'first': first, 'last': last}
+            encode_items(self.config, OpenCVBackend(self.config), items, os.path.join(seg_dir, record['file']), size)
+            added.append(record)
+        logging.info(f"{self.config.tag}Кадров вне сегментов: {sum(r['frames'] for r in added)} — "
+                     f"дописаны в {len(added)} доп. сегмент(ов)")
+        return sorted(parts + added, key=lambda rec: rec['first'])
+
+    def _delete_frames(self, frames):
+        """Удаление кадров после конвертации"""
+        if not frames or not self.config.get('delete_frames_after_video', False):
+            return
+        packs = {os.path.dirname(p.pack_path) for p in frames if not isinstance(p, str)}
+        files = [p for p in frames if isinstance(p, str)]
+        folders = {os.path.dirname(p) for p in files}
+        # Пачками с паузами: диск остаётся захвату, даже если кодирование идёт в этом же процессе
+        deleted = remove_files(files, max(1, int(self.config.get('retention_batch', 200))),
+                               float(self.config.get('retention_pause_ms', 50)) / 1000)
+        for folder in packs:
+            release_pack(folder)
+            deleted += delete_pack(folder)
+        for folder in folders | packs:
+            drop_index(folder)
+        logging.info(f"{self.config.tag}Удалено {deleted}/{len(frames)} JPG-кадров")
+        self.gui_queue.put(('delete_done', deleted))
+
+
+# ----------------------------------------------------------------------
+# Отдельный процесс кодирования: захват не ждёт видео, а тяжёлая работа
+# идёт с пониженным приоритетом
+# ----------------------------------------------------------------------
+class JobConfig(dict):
+    """Снимок конфига камеры для процесса кодирования"""
+    def __init__(self, config):
+        super().__init__(config.config)
+        self.tag = config.tag
+        self.capture_dir = config.capture_dir
+
+
+class _EventQueue:
+    """gui_queue внутри процесса кодирования: сообщения уходят в главный процесс"""
+    def __init__(self, events):
+        self.events = events
+
+    def put(self, msg):
+        self.events.put(('gui', msg))
+
+
+class _LogForwarder(logging.Handler):
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def emit(self, record):
+        try:
+            self.events.put(('log', record.levelno, record.getMessage()))
+        except Exception:
+            pass
+
+
+def set_process_priority(priority='below_normal', nice=10):
+    """Windows — класс приоритета, POSIX — nice; дочерние ffmpeg и пул процессов его наследуют"""
+    try:
+        proc = psutil.Process()
+        if sys.platform.startswith('win'):
+            proc.nice({
+                'idle': psutil.IDLE_PRIORITY_CLASS,
+                'below_normal': psutil.BELOW_NORMAL_PRIORITY_CLASS,
+                'normal': psutil.NORMAL_PRIORITY_CLASS,
+            }[priority])
+        else:
+            proc.nice(int(nice))
+    except Exception as e:
+        logging.warning(f"Не удалось понизить приоритет процесса кодирования: {e}")
+
+
+def encode_worker(jobs, events, priority, nice):
+    # Свой файловый лог не нужен — записи пересылаются главному процессу
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        h.close()
+        root.removeHandler(h)
+    root.addHandler(_LogForwarder(events))
+    root.setLevel(logging.INFO)
+    set_process_priority(priority, nice)
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        config, date_str, background = job
+        try:
+            ok = VideoEncoder(config, _EventQueue(events), None).encode(date_str, background)
+        except Exception as e:
+            logging.error(f"{config.tag}Сбой кодирования за {date_str}: {e}")
+            ok = False
+        events.put(('result', bool(ok)))
+
+
+class EncodeProcess:
+    """Долгоживущий процесс кодирования; задания по одному, прогресс и логи — обратно через очередь"""
+    def __init__(self, priority='below_normal', nice=10):
+        self.priority = priority
+        self.nice = nice
+        self.proc = None
+        self.jobs = None
+        self.events = None
+        self.lock = threading.Lock()
+
+    def _ensure(self):
+        if self.proc is not None and self.proc.is_alive():
+            return
+        self.jobs = multiprocessing.Queue()
+        self.events = multiprocessing.Queue()
+        # Не daemon: процессу кодирования нужен свой пул процессов (encode_processes)
+        self.proc = multiprocessing.Process(target=encode_worker, name="video-encoder",
+                                            args=(self.jobs, self.events, self.priority, self.nice))
+        self.proc.start()
+        logging.info(f"Процесс кодирования запущен: PID {self.proc.pid}")
+
+    def run(self, config, date_str, background, gui_queue):
+        """Выполняет задание в процессе кодирования; True — видео готово"""
+        with self.lock:
+            self._ensure()
+            self.jobs.put((config, date_str, background))
+            while True:
+                try:
+                    event = self.events.get(timeout=1)
+                except queue.Empty:
+                    if not self.proc.is_alive():
+                        logging.error(f"{config.tag}Процесс кодирования завершился (код {self.proc.exitcode})")
+                        self.proc = None
+                        return False
+                    continue
+                if event[0] == 'gui':
+                    gui_queue.put(event[1])
+                elif event[0] == 'log':
+                    logging.log(event[1], event[2])
+                else:
+                    return event[1]
+
+    def stop(self):
+        """При выходе: прерванное задание останется в очереди и продолжится с контрольной точки"""
+        proc, self.proc = self.proc, None
+        if proc is None or not proc.is_alive():
+            return
+        try:
+            for child in psutil.Process(proc.pid).children(recursive=True):
+                child.kill()
+        except psutil.Error:
+            pass
+        proc.kill()
+        proc.join(5)
+
+
+# ----------------------------------------------------------------------
+# Ролик за интервал времени: кодируются только кадры интервала
+# ----------------------------------------------------------------------
+def clip_items(config, start, end):
+    """Кадры камеры с start <= время < end (datetime) по порядку: индекс дня + пакет, без перебора дня"""
+    items = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end:
+        folder = os.path.join(config.capture_dir, day.strftime("%Y%m%d"))
+        index = day_index(folder)
+        if index is not None:
+            t0, t1 = start.timestamp(), end.timestamp()
+            # Кадры пакета с одинаковым временем (имена с суффиксом _N) — по очереди, в порядке записи
+            packed = collections.defaultdict(collections.deque)
+            for entry in pack_entries(folder, t0, t1):
+                packed[entry.name].append(entry)
+            for name in index.range(t0, t1):
+                # Имя из индекса — отдельный JPEG или очередной кадр пакета с тем же временем
+                path = os.path.join(folder, name)
+                if os.path.exists(path):
+                    items.append(path)
+                    continue
+                same = packed.get(name[:26] + ".jpg")
+                items.append(same.popleft() if same else path)
+        day += timedelta(days=1)
+    return items
+
+
+def export_clip(config, start, end, out_path=None, progress=None):
+    """Кодирует ролик за [start, end) выбранным video_backend. Возвращает (путь, число кадров)"""
+    items = clip_items(config, start, end)
+    if not items:
+        raise ValueError(f"Нет кадров с {start:%Y-%m-%d %H:%M:%S} по {end:%Y-%m-%d %H:%M:%S}")
+    first = _load_frame(items[0])
+    if first is None:
+        raise ValueError("Не удалось прочитать первый кадр интервала")
+    if out_path is None:
+        clips = os.path.join(config.capture_dir, "clips")
+        os.makedirs(clips, exist_ok=True)
+        out_path = os.path.join(clips, f"clip-{start:%Y%m%d_%H-%M-%S}_{end:%H-%M-%S}.mp4")
+    backend = make_backend(config)
+    started = time.monotonic()
+    encode_items(config, backend, items, out_path, (first.shape[1], first.shape[0]), progress)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    logging.info(f"{config.tag}Ролик {os.path.basename(out_path)}: {len(items)} кадров, {backend.name}, "
+                 f"{len(items) / elapsed:.0f} кадр/с")
+    return out_path, len(items)
+
+
+def main(argv=None):
+    import argparse
+    from main_classes import ConfigManager, CameraConfig
+
+    parser = argparse.ArgumentParser(description="Экспорт ролика за интервал времени")
+    parser.add_argument('start', help="начало: 'ГГГГ-ММ-ДД ЧЧ:ММ[:СС]'")
+    parser.add_argument('end', help="конец: 'ГГГГ-ММ-ДД ЧЧ:ММ[:СС]' или 'ЧЧ:ММ[:СС]' того же дня")
+    parser.add_argument('--camera', default='', help="имя камеры из cameras (по умолчанию — единственная)")
+    parser.add_argument('--out', help="файл ролика (по умолчанию capture/<камера>/clips/...)")
+    parser.add_argument('--config', default='config.yaml')
+    args = parser.parse_args(argv)
+
+    def parse(value, base=None):
+        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%H:%M:%S", "%H:%M"):
+            try:
+                dt = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            if fmt.startswith("%H"):
+                if base is None:
+                    break
+                dt = datetime.combine(base.date(), dt.time())
+            return dt
+        parser.error(f"не разобрать время: {value}")
+
+    start = parse(args.start)
+    end = parse(args.end, start)
+    if end <= start:
+        parser.error("конец интервала должен быть позже начала")
+
+    config_manager = ConfigManager(args.config, readonly=True)
+    cameras = config_manager.get_cameras()
+    camera = args.camera or cameras[0]
+    if camera not in cameras:
+        parser.error(f"нет камеры {camera}; есть: {', '.join(c or '(основная)' for c in cameras)}")
+    config = CameraConfig(config_manager, camera)
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end='', flush=True)
+
+    try:
+        out_path, count = export_clip(config, start, end, args.out, progress)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"\nГотово: {out_path} ({count} кадров)")
+    return 0
+
+
+if __name__ == "__main__":
+    # Утилита пишет в stderr: capture.log принадлежит запущенному GUI
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    sys.exit(main())